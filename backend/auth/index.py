@@ -4,177 +4,115 @@ Args: event with httpMethod, body, queryStringParameters
 Returns: HTTP response with user data or error
 '''
 
-import json
-import os
-import hashlib
-import hmac
 from typing import Dict, Any, Optional
-import psycopg2
-from psycopg2.extras import RealDictCursor
+from shared import presence, statements
+from shared.http import Router, Request, ok, error
+from shared.passwords import hash_password, verify_password
 
-def get_db_connection():
-    dsn = os.environ.get('DATABASE_URL')
-    return psycopg2.connect(dsn, cursor_factory=RealDictCursor)
+router = Router(
+    'auth',
+    allow_headers='Content-Type, X-User-Id, X-Auth-Token',
+    require_user=False,
+    conflict_message='User already exists'
+)
 
-def hash_password(password: str) -> str:
-    return hashlib.sha256(password.encode()).hexdigest()
+LOGIN_USER = statements.prepare(
+    'auth_login_user',
+    "SELECT id, email, display_name, avatar_url, created_at, password_hash FROM users WHERE email = %(email)s",
+    {'email': 'varchar'}
+)
+
+def account(req: Request) -> Optional[str]:
+    '''Login throttling is keyed by the email being tried, not by a session.'''
+    email = req.body.get('email')
+    return email.strip().lower() if isinstance(email, str) and email.strip() else None
+
+# register and login hash with scrypt, which takes tens of milliseconds of CPU:
+# they check out a connection only around their queries, never while hashing,
+# but still count against the concurrency cap
+@router.route('POST', 'register', db=False, admit=True, limits='ip=0.2/5')
+def register(req: Request) -> Dict[str, Any]:
+    email = req.body.get('email')
+    password = req.body.get('password')
+    display_name = req.body.get('display_name')
+
+    if not email or not password or not display_name:
+        return error(400, 'Missing required fields')
+
+    password_hash = hash_password(password)
+
+    with req.connection() as cur:
+        cur.execute(
+            "INSERT INTO users (email, password_hash, display_name) VALUES (%s, %s, %s) RETURNING id, email, display_name, avatar_url, created_at",
+            (email, password_hash, display_name)
+        )
+        user = cur.fetchone()
+        req.conn.commit()
+
+    return ok({'user': user})
+
+# Credential stuffing rotates accounts from few addresses, password spraying
+# rotates addresses against one account; the action cap bounds hashing work
+@router.route('POST', 'login', db=False, admit=True, limits='user=0.2/5,ip=1/20,action=100/200', subject=account)
+def login(req: Request) -> Dict[str, Any]:
+    email = req.body.get('email')
+    password = req.body.get('password')
+
+    if not email or not password:
+        return error(400, 'Missing email or password')
+
+    with req.connection() as cur:
+        statements.execute(cur, LOGIN_USER, {'email': email})
+        user = cur.fetchone()
+    stored = user.pop('password_hash') if user else None
+
+    # Unknown emails still pay for one verification so timing does not reveal them
+    matches, needs_rehash = verify_password(password, stored)
+    if not matches:
+        return error(401, 'Invalid credentials')
+
+    if needs_rehash:
+        # Upgrades legacy SHA-256 and outdated cost parameters; a concurrent upgrade wins
+        upgraded = hash_password(password)
+        with req.connection() as cur:
+            cur.execute(
+                "UPDATE users SET password_hash = %s WHERE id = %s AND password_hash = %s",
+                (upgraded, user['id'], stored)
+            )
+            req.conn.commit()
+
+    presence.touch(user['id'])
+
+    return ok({'user': user})
+
+@router.route('POST', 'google_auth')
+def google_auth(req: Request) -> Dict[str, Any]:
+    google_id = req.body.get('google_id')
+    email = req.body.get('email')
+    display_name = req.body.get('display_name')
+    avatar_url = req.body.get('avatar_url')
+
+    if not google_id or not email or not display_name:
+        return error(400, 'Missing Google auth data')
+
+    req.cur.execute(
+        "SELECT id, email, display_name, avatar_url, created_at FROM users WHERE google_id = %s",
+        (google_id,)
+    )
+    user = req.cur.fetchone()
+
+    if user:
+        presence.touch(user['id'])
+        return ok({'user': user})
+
+    req.cur.execute(
+        "INSERT INTO users (email, google_id, display_name, avatar_url) VALUES (%s, %s, %s, %s) RETURNING id, email, display_name, avatar_url, created_at",
+        (email, google_id, display_name, avatar_url)
+    )
+    user = req.cur.fetchone()
+    req.conn.commit()
+
+    return ok({'user': user})
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
-    method: str = event.get('httpMethod', 'GET')
-    
-    if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, X-Auth-Token',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': ''
-        }
-    
-    try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        
-        if method == 'POST':
-            body = json.loads(event.get('body', '{}'))
-            action = body.get('action')
-            
-            if action == 'register':
-                email = body.get('email')
-                password = body.get('password')
-                display_name = body.get('display_name')
-                
-                if not email or not password or not display_name:
-                    return {
-                        'statusCode': 400,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'error': 'Missing required fields'})
-                    }
-                
-                password_hash = hash_password(password)
-                
-                cur.execute(
-                    "INSERT INTO users (email, password_hash, display_name) VALUES (%s, %s, %s) RETURNING id, email, display_name, avatar_url, created_at",
-                    (email, password_hash, display_name)
-                )
-                user = cur.fetchone()
-                conn.commit()
-                
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'user': dict(user)}, default=str)
-                }
-            
-            elif action == 'login':
-                email = body.get('email')
-                password = body.get('password')
-                
-                if not email or not password:
-                    return {
-                        'statusCode': 400,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'error': 'Missing email or password'})
-                    }
-                
-                password_hash = hash_password(password)
-                
-                cur.execute(
-                    "SELECT id, email, display_name, avatar_url, created_at FROM users WHERE email = %s AND password_hash = %s",
-                    (email, password_hash)
-                )
-                user = cur.fetchone()
-                
-                if not user:
-                    return {
-                        'statusCode': 401,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'error': 'Invalid credentials'})
-                    }
-                
-                cur.execute(
-                    "UPDATE users SET last_seen = CURRENT_TIMESTAMP WHERE id = %s",
-                    (user['id'],)
-                )
-                conn.commit()
-                
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'user': dict(user)}, default=str)
-                }
-            
-            elif action == 'google_auth':
-                google_id = body.get('google_id')
-                email = body.get('email')
-                display_name = body.get('display_name')
-                avatar_url = body.get('avatar_url')
-                
-                if not google_id or not email or not display_name:
-                    return {
-                        'statusCode': 400,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'error': 'Missing Google auth data'})
-                    }
-                
-                cur.execute(
-                    "SELECT id, email, display_name, avatar_url, created_at FROM users WHERE google_id = %s",
-                    (google_id,)
-                )
-                user = cur.fetchone()
-                
-                if user:
-                    cur.execute(
-                        "UPDATE users SET last_seen = CURRENT_TIMESTAMP WHERE id = %s",
-                        (user['id'],)
-                    )
-                    conn.commit()
-                    return {
-                        'statusCode': 200,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'user': dict(user)}, default=str)
-                    }
-                
-                cur.execute(
-                    "INSERT INTO users (email, google_id, display_name, avatar_url) VALUES (%s, %s, %s, %s) RETURNING id, email, display_name, avatar_url, created_at",
-                    (email, google_id, display_name, avatar_url)
-                )
-                user = cur.fetchone()
-                conn.commit()
-                
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'user': dict(user)}, default=str)
-                }
-        
-        return {
-            'statusCode': 405,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Method not allowed'})
-        }
-    
-    except psycopg2.IntegrityError as e:
-        if conn:
-            conn.rollback()
-        return {
-            'statusCode': 409,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'User already exists'})
-        }
-    except Exception as e:
-        if conn:
-            conn.rollback()
-        return {
-            'statusCode': 500,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': str(e)})
-        }
-    finally:
-        if cur:
-            cur.close()
-        if conn:
-            conn.close()
+    return router.dispatch(event, context)
@@ -0,0 +1,50 @@
+'''
+Business: Close calls left pending or active after their client went away
+Args: CALLS_STALE_MINUTES (age after which an unfinished call counts as abandoned), chunk size per statement
+Returns: number of calls marked missed and added to the rollups
+'''
+
+import os
+from shared.call_stats import with_rollup
+
+STALE_MINUTES = int(os.environ.get('CALLS_STALE_MINUTES', '240'))
+
+# SKIP LOCKED lets several reapers share the backlog: each takes rows no other
+# transaction holds, including calls an end_call is finishing right now.
+# The candidate scan reads idx_calls_active_started (V0009) only
+REAP_SQL = """
+    WITH picked AS (
+        SELECT id, started_at
+        FROM calls
+        WHERE status IN ('pending', 'active')
+          AND started_at < LOCALTIMESTAMP - %(stale)s * interval '1 minute'
+        ORDER BY started_at
+        LIMIT %(chunk)s
+        FOR UPDATE SKIP LOCKED
+    ), reaped AS (
+        UPDATE calls c
+        SET status = 'missed',
+            ended_at = CURRENT_TIMESTAMP,
+            duration_seconds = 0,
+            stats_recorded = TRUE
+        FROM picked p
+        WHERE c.id = p.id AND c.started_at = p.started_at
+        RETURNING c.caller_id, c.receiver_id, c.status, c.started_at, c.duration_seconds
+    ), """ + with_rollup('reaped') + """
+    SELECT COUNT(*) AS calls FROM reaped
+"""
+
+
+def reap_chunk(conn, chunk: int, stale_minutes: int = STALE_MINUTES) -> int:
+    '''Marks up to chunk stale calls missed in one transaction and commits it.'''
+    cur = conn.cursor()
+    try:
+        cur.execute(REAP_SQL, {'stale': stale_minutes, 'chunk': chunk})
+        reaped = cur.fetchone()['calls']
+        conn.commit()
+        return reaped
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
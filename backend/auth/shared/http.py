@@ -0,0 +1,234 @@
+'''
+Business: Table-driven action routing and fast JSON responses for the backend functions
+Args: platform event dicts; routes registered per (method, action)
+Returns: response dicts built from shared constant headers, bodies encoded with orjson when installed
+'''
+
+import datetime
+import json
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+import psycopg2
+from shared import admission, metrics
+from shared.db import get_pool
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Shared by every response: never mutate, copy with {**JSON_HEADERS, ...} to add headers
+JSON_HEADERS = {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    return str(value)
+
+
+if orjson is not None:
+    def dumps(payload: Any) -> str:
+        # orjson encodes datetimes and dict subclasses such as RealDictRow natively
+        return orjson.dumps(payload, default=_default).decode()
+else:
+    _encoder = json.JSONEncoder(default=_default, separators=(',', ':'))
+
+    def dumps(payload: Any) -> str:
+        return _encoder.encode(payload)
+
+
+def encode(payload: Any) -> str:
+    m = metrics.current() if metrics.ENABLED else None
+    if m is None:
+        return dumps(payload)
+    started = time.perf_counter()
+    body = dumps(payload)
+    m.serialize_ms += (time.perf_counter() - started) * 1000
+    return body
+
+
+def ok(payload: Any) -> Dict[str, Any]:
+    return {'statusCode': 200, 'headers': JSON_HEADERS, 'body': encode(payload)}
+
+
+def error(status: int, message: str) -> Dict[str, Any]:
+    return {'statusCode': status, 'headers': JSON_HEADERS, 'body': dumps({'error': message})}
+
+
+UNAUTHORIZED = error(401, 'Unauthorized')
+METHOD_NOT_ALLOWED = error(405, 'Method not allowed')
+
+
+class Request:
+    __slots__ = ('event', 'method', 'action', 'params', 'body', 'user_id', 'conn', 'cur')
+
+    def __init__(self, event: Dict[str, Any], method: str, action: Optional[str],
+                 params: Dict[str, Any], body: Dict[str, Any], user_id: Optional[str]):
+        self.event = event
+        self.method = method
+        self.action = action
+        self.params = params
+        self.body = body
+        self.user_id = user_id
+        self.conn = None
+        self.cur = None
+
+    @contextmanager
+    def connection(self) -> Iterator[Any]:
+        '''
+        For db=False routes that need the database only around some queries:
+        sets conn and cur for the block and returns the connection to the pool
+        after it, instrumented like a db=True route.
+        '''
+        self.conn, self.cur = checkout()
+        try:
+            yield self.cur
+        finally:
+            self.cur.close()
+            get_pool().release(self.conn)
+            self.conn = self.cur = None
+
+
+def checkout() -> Tuple[Any, Any]:
+    m = metrics.current() if metrics.ENABLED else None
+    if m is None:
+        conn = get_pool().acquire()
+        return conn, conn.cursor()
+    started = time.perf_counter()
+    conn = get_pool().acquire()
+    m.connect_ms += (time.perf_counter() - started) * 1000
+    return conn, conn.cursor(cursor_factory=metrics.InstrumentedCursor)
+
+
+Route = Callable[[Request], Dict[str, Any]]
+Subject = Callable[[Request], Optional[str]]
+
+
+class Router:
+    '''
+    Dispatches on (method, action) with one dict lookup. GET actions come from
+    the query string (falling back to default_get), other methods read
+    "action" from the JSON body. Routes registered with db=True get a pooled
+    connection and cursor on the request that are released afterwards; db=False
+    routes can open one for part of the request with req.connection().
+    Admission control (rate limits, then the process-wide concurrency cap)
+    runs after routing and before the pool is touched.
+    '''
+
+    def __init__(self, name: str, allow_headers: str, default_get: Optional[str] = None,
+                 require_user: bool = True, conflict_message: Optional[str] = None,
+                 allow_methods: str = 'GET, POST, PUT, DELETE, OPTIONS'):
+        self.name = name
+        self.default_get = default_get
+        self.require_user = require_user
+        self.conflict_message = conflict_message
+        self.routes: Dict[Tuple[str, Optional[str]], Tuple[Route, bool, bool, admission.Policy, Optional[Subject]]] = {}
+        self.preflight = {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': allow_methods,
+                'Access-Control-Allow-Headers': allow_headers,
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': ''
+        }
+
+    def route(self, method: str, action: Optional[str], db: bool = True, limits: str = '',
+              subject: Optional[Subject] = None, admit: Optional[bool] = None) -> Callable[[Route], Route]:
+        '''
+        limits is the default admission spec ("user=5/20,ip=10/50,action=200");
+        ADMISSION_<NAME>_<ACTION> overrides it. subject picks the key of the
+        user scope and defaults to X-User-Id. admit counts the route against
+        the concurrency cap and defaults to db.
+        '''
+        policy = admission.Policy(self.name, action, limits)
+        admit = db if admit is None else admit
+
+        def register(fn: Route) -> Route:
+            self.routes[(method, action)] = (fn, db, admit, policy, subject)
+            return fn
+        return register
+
+    def dispatch(self, event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+        if not metrics.ENABLED:
+            return self._dispatch(event, context)
+        m = metrics.begin(self.name)
+        try:
+            response = self._dispatch(event, context)
+        except BaseException:
+            metrics.finish(m, {'statusCode': 500})
+            raise
+        return metrics.finish(m, response)
+
+    def _dispatch(self, event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+        method: str = event.get('httpMethod', 'GET')
+
+        if method == 'OPTIONS':
+            return self.preflight
+
+        user_id = None
+        if self.require_user:
+            headers = event.get('headers') or {}
+            user_id = headers.get('x-user-id') or headers.get('X-User-Id')
+            if not user_id:
+                return UNAUTHORIZED
+
+        conn = None
+        cur = None
+        action = None
+        admitted = False
+        try:
+            params = event.get('queryStringParameters') or {}
+            if method == 'GET':
+                body: Dict[str, Any] = {}
+                action = params.get('action', self.default_get)
+            else:
+                body = json.loads(event.get('body') or '{}')
+                action = body.get('action')
+
+            m = metrics.current() if metrics.ENABLED else None
+            if m is not None:
+                m.action = action
+
+            entry = self.routes.get((method, action))
+            if entry is None:
+                return METHOD_NOT_ALLOWED
+            fn, needs_db, admit, policy, subject = entry
+
+            request = Request(event, method, action, params, body, user_id)
+            if admission.ENABLED:
+                if policy.tables:
+                    wait = policy.check({
+                        'user': subject(request) if subject else user_id,
+                        'ip': admission.client_ip(event),
+                        'action': '*',
+                    })
+                    if wait:
+                        return admission.throttled(wait)
+                # Long polls and streamed exports are db=False and stay out: they would pin slots
+                if admit:
+                    if not admission.concurrency.acquire():
+                        return admission.OVERLOADED
+                    admitted = True
+            if needs_db:
+                conn, cur = checkout()
+                request.conn = conn
+                request.cur = cur
+            return fn(request)
+
+        except Exception as e:
+            # The pool rolls back whatever transaction the route left open
+            if isinstance(e, psycopg2.IntegrityError) and self.conflict_message:
+                return error(409, self.conflict_message)
+            metrics.log_error(self.name, action, e)
+            return error(500, str(e))
+        finally:
+            if cur:
+                cur.close()
+            if conn:
+                get_pool().release(conn)
+            if admitted:
+                admission.concurrency.release()
@@ -0,0 +1,178 @@
+'''
+Business: Per-request timing, query and action metrics for the backend functions
+Args: METRICS=1 to enable, METRICS_SERVER_TIMING=1 for the Server-Timing header,
+      METRICS_SLOW_QUERY_MS and METRICS_EMIT_INTERVAL to tune logging
+Returns: one structured JSON log line per request plus periodic per-action histograms
+'''
+
+import os
+import sys
+import threading
+import time
+import traceback
+from typing import Any, Dict, List, Optional
+from psycopg2.extras import RealDictCursor
+from shared.db import get_pool
+from shared.statements import registry as statements
+
+_FLAGS = ('1', 'true', 'yes', 'on')
+ENABLED = os.environ.get('METRICS', '').lower() in _FLAGS
+SERVER_TIMING = ENABLED and os.environ.get('METRICS_SERVER_TIMING', '').lower() in _FLAGS
+SLOW_QUERY_MS = float(os.environ.get('METRICS_SLOW_QUERY_MS', '100'))
+EMIT_INTERVAL = float(os.environ.get('METRICS_EMIT_INTERVAL', '60'))
+BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+_local = threading.local()
+
+
+class RequestMetrics:
+    __slots__ = ('function', 'action', 'started', 'connect_ms', 'db_ms', 'serialize_ms', 'statements', 'slow')
+
+    def __init__(self, function: str):
+        self.function = function
+        self.action: Optional[str] = None
+        self.started = time.perf_counter()
+        self.connect_ms = 0.0
+        self.db_ms = 0.0
+        self.serialize_ms = 0.0
+        self.statements: List[List[float]] = []
+        self.slow: List[Dict[str, Any]] = []
+
+
+class InstrumentedCursor(RealDictCursor):
+    '''RealDictCursor that adds each statement's duration and row count to the current request.'''
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            _record_statement(self, query, started)
+
+    def executemany(self, query, vars_list):
+        started = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            _record_statement(self, query, started)
+
+    def copy_expert(self, sql, file, size=8192):
+        started = time.perf_counter()
+        try:
+            return super().copy_expert(sql, file, size)
+        finally:
+            _record_statement(self, sql, started)
+
+
+def _record_statement(cursor, query: Any, started: float) -> None:
+    m = current()
+    if m is None:
+        return
+    ms = (time.perf_counter() - started) * 1000
+    rows = max(cursor.rowcount, 0)
+    m.db_ms += ms
+    m.statements.append([round(ms, 3), rows])
+    if ms >= SLOW_QUERY_MS:
+        text = query.decode() if isinstance(query, bytes) else str(query)
+        m.slow.append({'ms': round(ms, 3), 'rows': rows, 'sql': ' '.join(text.split())[:300]})
+
+
+class Registry:
+    '''Per-action request counts, status codes and latency histograms since the last emit.'''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._actions: Dict[str, Dict[str, Any]] = {}
+        self._emitted = time.monotonic()
+
+    def observe(self, key: str, status: int, total_ms: float) -> None:
+        with self._lock:
+            entry = self._actions.get(key)
+            if entry is None:
+                entry = {'count': 0, 'sum_ms': 0.0, 'status': {}, 'buckets': [0] * (len(BUCKETS_MS) + 1)}
+                self._actions[key] = entry
+            entry['count'] += 1
+            entry['sum_ms'] += total_ms
+            code = str(status)
+            entry['status'][code] = entry['status'].get(code, 0) + 1
+            i = 0
+            while i < len(BUCKETS_MS) and total_ms > BUCKETS_MS[i]:
+                i += 1
+            entry['buckets'][i] += 1
+
+    def snapshot(self, reset: bool = False) -> Dict[str, Any]:
+        with self._lock:
+            actions = self._actions
+            if reset:
+                self._actions = {}
+                self._emitted = time.monotonic()
+            else:
+                actions = {k: dict(v, status=dict(v['status']), buckets=list(v['buckets'])) for k, v in actions.items()}
+        return {'buckets_ms': list(BUCKETS_MS), 'actions': actions}
+
+    def due(self) -> bool:
+        return time.monotonic() - self._emitted >= EMIT_INTERVAL
+
+
+registry = Registry()
+
+
+def current() -> Optional[RequestMetrics]:
+    return getattr(_local, 'metrics', None)
+
+
+def begin(function: str) -> RequestMetrics:
+    m = RequestMetrics(function)
+    _local.metrics = m
+    return m
+
+
+def emit(record: Dict[str, Any]) -> None:
+    from shared.http import dumps
+    sys.stdout.write(dumps(record) + '\n')
+    sys.stdout.flush()
+
+
+def log_error(function: str, action: Optional[str], exc: BaseException) -> None:
+    '''Always on: the client only sees str(e), the log keeps the type and traceback.'''
+    emit({
+        'type': 'error',
+        'function': function,
+        'action': action,
+        'error': type(exc).__name__,
+        'message': str(exc),
+        'traceback': traceback.format_exception(type(exc), exc, exc.__traceback__)[-5:],
+    })
+
+
+def finish(m: RequestMetrics, response: Dict[str, Any]) -> Dict[str, Any]:
+    _local.metrics = None
+    total_ms = (time.perf_counter() - m.started) * 1000
+    status = response.get('statusCode', 0)
+    key = f'{m.function}:{m.action}'
+    registry.observe(key, status, total_ms)
+    emit({
+        'type': 'request',
+        'function': m.function,
+        'action': m.action,
+        'status': status,
+        'total_ms': round(total_ms, 3),
+        'connect_ms': round(m.connect_ms, 3),
+        'db_ms': round(m.db_ms, 3),
+        'serialize_ms': round(m.serialize_ms, 3),
+        'queries': len(m.statements),
+        'rows': sum(int(s[1]) for s in m.statements),
+        'statements': m.statements,
+        'slow': m.slow,
+    })
+    if registry.due():
+        snapshot = registry.snapshot(reset=True)
+        snapshot.update({'type': 'metrics', 'function': m.function, 'pool': get_pool().stats(),
+                         'statements': statements.stats()})
+        emit(snapshot)
+    if SERVER_TIMING:
+        timing = (f'connect;dur={m.connect_ms:.2f}, db;dur={m.db_ms:.2f};desc="{len(m.statements)} queries", '
+                  f'serialize;dur={m.serialize_ms:.2f}, total;dur={total_ms:.2f}')
+        headers = {**response.get('headers', {}), 'Server-Timing': timing, 'Timing-Allow-Origin': '*'}
+        response = dict(response, headers=headers)
+    return response
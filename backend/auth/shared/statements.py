@@ -0,0 +1,109 @@
+'''
+Business: Server-side prepared statements for the hot read queries
+Args: DB_PREPARE=0 to fall back to plain execute; statements use %(name)s placeholders
+Returns: EXECUTE of a statement PREPAREd once per connection, with per-statement prepare/execute counts
+'''
+
+import os
+import re
+import threading
+import weakref
+from typing import Any, Dict, List, Optional, Set
+
+ENABLED = os.environ.get('DB_PREPARE', '1').lower() not in ('0', 'false', 'no', 'off')
+
+_PLACEHOLDER = re.compile(r'%\((\w+)\)s')
+
+
+class Statement:
+    '''
+    One SQL text under a fixed name. Named placeholders become $1..$n in the
+    order they first appear; types default to unknown, which PREPARE infers
+    from context.
+    '''
+
+    def __init__(self, name: str, sql: str, types: Optional[Dict[str, str]] = None):
+        self.name = name
+        self.sql = sql
+        self.types = dict(types or {})
+        self.params: List[str] = []
+
+        def number(match) -> str:
+            key = match.group(1)
+            if key not in self.params:
+                self.params.append(key)
+            return f'${self.params.index(key) + 1}'
+
+        text = _PLACEHOLDER.sub(number, sql).replace('%%', '%')
+        signature = ', '.join(self.types.get(p, 'unknown') for p in self.params)
+        self.prepare_sql = f'PREPARE {name} ({signature}) AS {text}' if self.params else f'PREPARE {name} AS {text}'
+        placeholders = ', '.join(['%s'] * len(self.params))
+        self.execute_sql = f'EXECUTE {name} ({placeholders})' if self.params else f'EXECUTE {name}'
+
+
+class StatementRegistry:
+    '''
+    Tracks which statements each connection has prepared. Entries are weak, so
+    a connection the pool replaces takes its set with it, and the pool also
+    calls forget() when it closes one. PREPARE outlives transaction rollback,
+    so a set only goes stale when its connection does.
+    '''
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._statements: Dict[str, Statement] = {}
+        self._prepared: 'weakref.WeakKeyDictionary[Any, Set[str]]' = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self._counts: Dict[str, Dict[str, int]] = {}
+
+    def register(self, name: str, sql: str, types: Optional[Dict[str, str]] = None) -> Statement:
+        statement = Statement(name, sql, types)
+        with self._lock:
+            existing = self._statements.get(name)
+            if existing is not None and existing.sql != sql:
+                raise ValueError(f'Statement {name} is already registered with different SQL')
+            self._statements[name] = statement
+            self._counts.setdefault(name, {'prepares': 0, 'executes': 0})
+        return statement
+
+    def get(self, name: str) -> Statement:
+        return self._statements[name]
+
+    def execute(self, cur, statement: Statement, params: Dict[str, Any]) -> None:
+        if not self.enabled:
+            cur.execute(statement.sql, params)
+            return
+        conn = cur.connection
+        with self._lock:
+            prepared = self._prepared.get(conn)
+            if prepared is None:
+                prepared = self._prepared[conn] = set()
+            counts = self._counts[statement.name]
+            counts['executes'] += 1
+            fresh = statement.name not in prepared
+            if fresh:
+                counts['prepares'] += 1
+        if fresh:
+            cur.execute(statement.prepare_sql)
+            prepared.add(statement.name)
+        cur.execute(statement.execute_sql, [params[p] for p in statement.params])
+
+    def forget(self, conn) -> None:
+        with self._lock:
+            self._prepared.pop(conn, None)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        '''hits are executes that reused a statement already prepared on their connection.'''
+        with self._lock:
+            return {name: dict(c, hits=c['executes'] - c['prepares']) for name, c in self._counts.items()}
+
+
+registry = StatementRegistry(ENABLED)
+
+
+def prepare(name: str, sql: str, types: Optional[Dict[str, str]] = None) -> Statement:
+    return registry.register(name, sql, types)
+
+
+def execute(cur, statement: Statement, params: Dict[str, Any]) -> None:
+    registry.execute(cur, statement, params)
@@ -4,153 +4,287 @@ Args: event with httpMethod, body, headers (X-User-Id)
 Returns: HTTP response with call data and status
 '''
 
-import json
 import os
-from typing import Dict, Any
-import psycopg2
-from psycopg2.extras import RealDictCursor
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, Tuple
+from shared import etags, statements
+from shared.cursors import page_size
+from shared.export import Export, FORMATS
+from shared.call_reaper import STALE_MINUTES
+from shared.call_stats import with_rollup
+from shared.http import Router, Request, ok, error
 
-def get_db_connection():
-    dsn = os.environ.get('DATABASE_URL')
-    return psycopg2.connect(dsn, cursor_factory=RealDictCursor)
+router = Router('calls', allow_headers='Content-Type, X-User-Id, If-None-Match', default_get='history')
 
-def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
-    method: str = event.get('httpMethod', 'GET')
-    
-    if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': ''
-        }
-    
-    headers = event.get('headers', {})
-    user_id = headers.get('x-user-id') or headers.get('X-User-Id')
-    
-    if not user_id:
-        return {
-            'statusCode': 401,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Unauthorized'})
-        }
-    
+HISTORY_SQL = """
+    SELECT c.id, c.status, c.started_at, c.ended_at, c.duration_seconds,
+           c.caller_id, c.receiver_id,
+           u.display_name as other_user_name, u.avatar_url as other_user_avatar
+    FROM (
+        (SELECT id, status, started_at, ended_at, duration_seconds, caller_id, receiver_id
+         FROM calls
+         WHERE caller_id = %(user_id)s {keyset}
+         ORDER BY started_at DESC, id DESC
+         LIMIT %(limit)s)
+        UNION ALL
+        (SELECT id, status, started_at, ended_at, duration_seconds, caller_id, receiver_id
+         FROM calls
+         WHERE receiver_id = %(user_id)s AND caller_id <> %(user_id)s {keyset}
+         ORDER BY started_at DESC, id DESC
+         LIMIT %(limit)s)
+    ) c
+    INNER JOIN users u ON u.id = CASE WHEN c.caller_id = %(user_id)s THEN c.receiver_id ELSE c.caller_id END
+    ORDER BY c.started_at DESC, c.id DESC
+    LIMIT %(limit)s
+"""
+# Separate statements per page kind: a generic plan cannot drop an
+# "IS NULL OR" keyset, which would turn the index condition into a filter.
+# A page is read from the partitions after `since` (the window start) first;
+# only the rows still missing are then read from the older partitions
+HISTORY_TYPES = {'user_id': 'int', 'ts': 'timestamp', 'id': 'int', 'limit': 'int', 'since': 'timestamp'}
+KEYSET = 'AND (started_at, id) < (%(ts)s, %(id)s)'
+HISTORY_FIRST_RECENT = statements.prepare(
+    'calls_history_first_recent', HISTORY_SQL.format(keyset='AND started_at >= %(since)s'), HISTORY_TYPES
+)
+HISTORY_BEFORE_RECENT = statements.prepare(
+    'calls_history_before_recent', HISTORY_SQL.format(keyset=KEYSET + ' AND started_at >= %(since)s'), HISTORY_TYPES
+)
+# Everything before the window is older than any in-window cursor, so no keyset is needed
+HISTORY_OLDER = statements.prepare(
+    'calls_history_older', HISTORY_SQL.format(keyset='AND started_at < %(since)s'), HISTORY_TYPES
+)
+HISTORY_BEFORE = statements.prepare('calls_history_before', HISTORY_SQL.format(keyset=KEYSET), HISTORY_TYPES)
+HISTORY_WINDOW_DAYS = int(os.environ.get('CALLS_HISTORY_WINDOW_DAYS', '90'))
+
+# end_call without started_at only looks at calls begun this recently;
+# keep it above CALLS_STALE_MINUTES so every call the reaper leaves alone can still be ended
+END_WINDOW_HOURS = int(os.environ.get('CALLS_END_WINDOW_HOURS', '48'))
+
+# One probe per side into the partial active-call indexes (V0009). Calls older
+# than the reaper timeout are ignored even before the reaper gets to them, and
+# the lower bound keeps partition pruning to the newest months
+CURRENT_SQL = """
+    SELECT c.id, c.status, c.started_at, c.caller_id, c.receiver_id,
+           u.display_name as other_user_name, u.avatar_url as other_user_avatar
+    FROM (
+        (SELECT id, status, started_at, caller_id, receiver_id
+         FROM calls
+         WHERE caller_id = %(user_id)s AND status IN ('pending', 'active')
+           AND started_at >= LOCALTIMESTAMP - %(stale)s * interval '1 minute'
+         ORDER BY started_at DESC
+         LIMIT 1)
+        UNION ALL
+        (SELECT id, status, started_at, caller_id, receiver_id
+         FROM calls
+         WHERE receiver_id = %(user_id)s AND status IN ('pending', 'active')
+           AND started_at >= LOCALTIMESTAMP - %(stale)s * interval '1 minute'
+         ORDER BY started_at DESC
+         LIMIT 1)
+    ) c
+    INNER JOIN users u ON u.id = CASE WHEN c.caller_id = %(user_id)s THEN c.receiver_id ELSE c.caller_id END
+    ORDER BY c.started_at DESC
+    LIMIT 1
+"""
+CURRENT = statements.prepare('calls_current', CURRENT_SQL, {'user_id': 'int', 'stale': 'int'})
+
+EXPORT_COLUMNS = ['id', 'caller_id', 'receiver_id', 'status', 'started_at', 'ended_at', 'duration_seconds']
+
+# Both branches scan their (user, started_at DESC, id DESC) index in reverse,
+# i.e. ascending, so a Merge Append yields (started_at, id) order and nothing
+# is sorted in memory; resuming with > keeps the keyset an index condition
+EXPORT_SQL = """
+    SELECT * FROM (
+        (SELECT id, caller_id, receiver_id, status, started_at, ended_at, duration_seconds
+         FROM calls
+         WHERE caller_id = %(user_id)s {filters})
+        UNION ALL
+        (SELECT id, caller_id, receiver_id, status, started_at, ended_at, duration_seconds
+         FROM calls
+         WHERE receiver_id = %(user_id)s AND caller_id <> %(user_id)s {filters})
+    ) c
+    ORDER BY started_at, id
+"""
+
+def parse_before(value: Optional[str], param: str = 'before') -> Tuple[Optional[str], Optional[int]]:
+    if not value:
+        return None, None
+    started_at, _, call_id = value.rpartition(',')
+    try:
+        datetime.fromisoformat(started_at)
+        return started_at, int(call_id)
+    except ValueError:
+        raise ValueError(f'Invalid {param} cursor, expected <started_at>,<id>')
+
+def parse_date(value: Optional[str], param: str) -> Optional[str]:
+    if not value:
+        return None
+    try:
+        datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f'Invalid {param}, expected an ISO 8601 date or timestamp')
+    return value
+
+@router.route('POST', 'start_call')
+def start_call(req: Request) -> Dict[str, Any]:
+    receiver_id = req.body.get('receiver_id')
+
+    if not receiver_id:
+        return error(400, 'Missing receiver_id')
+
+    req.cur.execute(
+        "INSERT INTO calls (caller_id, receiver_id, status) VALUES (%s, %s, 'active') RETURNING id, started_at",
+        (req.user_id, receiver_id)
+    )
+    call = req.cur.fetchone()
+    req.conn.commit()
+
+    return ok({'call': call})
+
+@router.route('POST', 'end_call')
+def end_call(req: Request) -> Dict[str, Any]:
+    call_id = req.body.get('call_id')
+
+    if not call_id:
+        return error(400, 'Missing call_id')
+
+    # started_at (returned by start_call) pins the call to one partition;
+    # without it only the partitions of the last END_WINDOW_HOURS are searched
+    try:
+        started_at = parse_date(req.body.get('started_at'), 'started_at')
+    except ValueError as e:
+        return error(400, str(e))
+    if started_at:
+        bound = 'started_at = %(started_at)s::timestamp'
+    else:
+        bound = "started_at >= LOCALTIMESTAMP - %(window)s * interval '1 hour'"
+    params = {'call_id': call_id, 'user_id': req.user_id, 'started_at': started_at, 'window': END_WINDOW_HOURS}
+
+    # Ending and counting the call in the rollups is one statement;
+    # repeating end_call on a finished call returns it unchanged
+    req.cur.execute("""
+        WITH ended AS (
+            UPDATE calls
+            SET status = 'ended',
+                ended_at = CURRENT_TIMESTAMP,
+                duration_seconds = EXTRACT(EPOCH FROM (CURRENT_TIMESTAMP - started_at))::INTEGER,
+                stats_recorded = TRUE
+            WHERE id = %(call_id)s AND (caller_id = %(user_id)s OR receiver_id = %(user_id)s)
+              AND status IN ('pending', 'active') AND """ + bound + """
+            RETURNING id, caller_id, receiver_id, status, started_at, duration_seconds
+        ), """ + with_rollup('ended') + """
+        SELECT id, duration_seconds FROM ended
+    """, params)
+
+    call = req.cur.fetchone()
+
+    if not call:
+        req.cur.execute(
+            "SELECT id, duration_seconds FROM calls WHERE id = %(call_id)s AND (caller_id = %(user_id)s OR receiver_id = %(user_id)s) AND " + bound,
+            params
+        )
+        call = req.cur.fetchone()
+
+    if not call:
+        return error(404, 'Call not found')
+
+    req.conn.commit()
+
+    return ok({'call': call})
+
+@router.route('GET', 'stats')
+def stats(req: Request) -> Dict[str, Any]:
+    try:
+        days = min(max(int(req.params.get('days', 30)), 1), 366)
+    except ValueError:
+        return error(400, 'Invalid days')
+
+    req.cur.execute("""
+        SELECT calls_made, calls_received, answered, missed, seconds_total, updated_at
+        FROM user_call_stats
+        WHERE user_id = %s
+    """, (req.user_id,))
+    totals = req.cur.fetchone()
+    req.cur.execute("""
+        SELECT day, calls, answered, missed, seconds_total
+        FROM user_call_stats_daily
+        WHERE user_id = %s AND day > CURRENT_DATE - %s
+        ORDER BY day
+    """, (req.user_id, days))
+    daily = req.cur.fetchall()
+
+    totals = totals or {
+        'calls_made': 0, 'calls_received': 0, 'answered': 0, 'missed': 0,
+        'seconds_total': 0, 'updated_at': None
+    }
+    totals['calls_total'] = totals['calls_made'] + totals['calls_received']
+    totals['minutes_total'] = round(totals['seconds_total'] / 60, 1)
+
+    return ok({'stats': totals, 'daily': daily})
+
+@router.route('GET', 'current')
+def current(req: Request) -> Dict[str, Any]:
+    statements.execute(req.cur, CURRENT, {'user_id': req.user_id, 'stale': STALE_MINUTES})
+    return ok({'call': req.cur.fetchone()})
+
+@router.route('GET', 'history')
+def history(req: Request) -> Dict[str, Any]:
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        
-        if method == 'POST':
-            body = json.loads(event.get('body', '{}'))
-            action = body.get('action')
-            
-            if action == 'start_call':
-                receiver_id = body.get('receiver_id')
-                
-                if not receiver_id:
-                    return {
-                        'statusCode': 400,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'error': 'Missing receiver_id'})
-                    }
-                
-                cur.execute(
-                    "INSERT INTO calls (caller_id, receiver_id, status) VALUES (%s, %s, 'active') RETURNING id, started_at",
-                    (user_id, receiver_id)
-                )
-                call = cur.fetchone()
-                conn.commit()
-                
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'call': dict(call)}, default=str)
-                }
-            
-            elif action == 'end_call':
-                call_id = body.get('call_id')
-                
-                if not call_id:
-                    return {
-                        'statusCode': 400,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'error': 'Missing call_id'})
-                    }
-                
-                cur.execute("""
-                    UPDATE calls 
-                    SET status = 'ended', 
-                        ended_at = CURRENT_TIMESTAMP,
-                        duration_seconds = EXTRACT(EPOCH FROM (CURRENT_TIMESTAMP - started_at))::INTEGER
-                    WHERE id = %s AND (caller_id = %s OR receiver_id = %s)
-                    RETURNING id, duration_seconds
-                """, (call_id, user_id, user_id))
-                
-                call = cur.fetchone()
-                
-                if not call:
-                    return {
-                        'statusCode': 404,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'error': 'Call not found'})
-                    }
-                
-                conn.commit()
-                
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'call': dict(call)}, default=str)
-                }
-        
-        elif method == 'GET':
-            params = event.get('queryStringParameters', {})
-            action = params.get('action', 'history')
-            
-            if action == 'history':
-                cur.execute("""
-                    SELECT c.id, c.status, c.started_at, c.ended_at, c.duration_seconds,
-                           c.caller_id, c.receiver_id,
-                           u.display_name as other_user_name, u.avatar_url as other_user_avatar
-                    FROM calls c
-                    INNER JOIN users u ON (
-                        CASE 
-                            WHEN c.caller_id = %s THEN u.id = c.receiver_id
-                            ELSE u.id = c.caller_id
-                        END
-                    )
-                    WHERE c.caller_id = %s OR c.receiver_id = %s
-                    ORDER BY c.started_at DESC
-                    LIMIT 50
-                """, (user_id, user_id, user_id))
-                
-                calls = cur.fetchall()
-                
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'calls': [dict(c) for c in calls]}, default=str)
-                }
-        
-        return {
-            'statusCode': 405,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Method not allowed'})
-        }
-    
-    except Exception as e:
-        if conn:
-            conn.rollback()
-        return {
-            'statusCode': 500,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': str(e)})
-        }
-    finally:
-        if cur:
-            cur.close()
-        if conn:
-            conn.close()
+        limit = page_size(req.params.get('limit'), 50, 200)
+        before = parse_before(req.params.get('before'))
+    except ValueError as e:
+        return error(400, str(e))
+
+    etag, cached = etags.check(req, 'calls', page=(limit, *before))
+    if cached:
+        return cached
+
+    since = datetime.now() - timedelta(days=HISTORY_WINDOW_DAYS)
+    params = {'user_id': req.user_id, 'ts': before[0], 'id': before[1], 'limit': limit + 1, 'since': since}
+    if before[0] is not None and datetime.fromisoformat(before[0]).replace(tzinfo=None) < since:
+        # Deep pages past the window: the keyset alone bounds the partitions
+        statements.execute(req.cur, HISTORY_BEFORE, params)
+        calls = req.cur.fetchall()
+    else:
+        statements.execute(req.cur, HISTORY_FIRST_RECENT if before[0] is None else HISTORY_BEFORE_RECENT, params)
+        calls = req.cur.fetchall()
+        if len(calls) <= limit:
+            # The window could not fill the page: fetch only the missing rows from older months
+            statements.execute(req.cur, HISTORY_OLDER, dict(params, limit=limit + 1 - len(calls)))
+            calls += req.cur.fetchall()
+
+    next_before = None
+    if len(calls) > limit:
+        calls = calls[:limit]
+        next_before = f"{calls[-1]['started_at'].isoformat()},{calls[-1]['id']}"
+
+    return etags.tagged(ok({'calls': calls, 'next_before': next_before}), etag)
+
+@router.route('GET', 'export', db=False)
+def export(req: Request) -> Dict[str, Any]:
+    fmt = req.params.get('format', 'ndjson')
+    if fmt not in FORMATS:
+        return error(400, 'Invalid format, expected ndjson or csv')
+    try:
+        after = parse_before(req.params.get('after'), 'after')
+        since = parse_date(req.params.get('from'), 'from')
+        until = parse_date(req.params.get('to'), 'to')
+        limit = page_size(req.params['limit'], 1, 10 ** 9) if req.params.get('limit') else None
+    except ValueError as e:
+        return error(400, str(e))
+
+    filters = []
+    if since:
+        filters.append('started_at >= %(since)s::timestamp')
+    if until:
+        filters.append('started_at < %(until)s::timestamp')
+    if after[0] is not None:
+        filters.append('(started_at, id) > (%(ts)s::timestamp, %(id)s)')
+    sql = EXPORT_SQL.format(filters=''.join(' AND ' + f for f in filters))
+    params = {'user_id': req.user_id, 'since': since, 'until': until, 'ts': after[0], 'id': after[1]}
+
+    job = Export('calls_export', sql, params, EXPORT_COLUMNS, fmt,
+                 lambda row: f"{row['started_at'].isoformat()},{row['id']}")
+    return job.response(req.event, limit)
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    return router.dispatch(event, context)
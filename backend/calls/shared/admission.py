@@ -0,0 +1,152 @@
+'''
+Business: In-process admission control in front of the connection pool
+Args: per-action limits "scope=rate/burst,..." for the user, ip and action scopes (code defaults, overridden by
+      ADMISSION_<FUNCTION>_<ACTION>), ADMISSION_MAX_CONCURRENT, ADMISSION_QUEUE_MS, ADMISSION=0 to disable
+Returns: None to admit a request, or a 429/503 response with Retry-After built without touching the database
+'''
+
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+ENABLED = os.environ.get('ADMISSION', '1').lower() not in ('0', 'false', 'no', 'off')
+MAX_CONCURRENT = int(os.environ.get('ADMISSION_MAX_CONCURRENT', '0'))
+QUEUE_MS = float(os.environ.get('ADMISSION_QUEUE_MS', '50'))
+MAX_KEYS = int(os.environ.get('ADMISSION_MAX_KEYS', '100000'))
+
+SCOPES = ('user', 'ip', 'action')
+
+_HEADERS = {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*',
+            'Access-Control-Expose-Headers': 'Retry-After'}
+
+
+class BucketTable:
+    '''
+    Token buckets for one scope of one action, keyed by user, IP or a single
+    shared key. Each holds up to burst tokens and refills at rate per second;
+    a request takes one. Least recently used keys are dropped past max_keys,
+    which hands a forgotten key a full bucket but bounds memory under floods
+    from many addresses.
+    '''
+
+    def __init__(self, rate: float, burst: float, max_keys: int = MAX_KEYS):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets: 'OrderedDict[Any, list]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def wait(self, key: Any, now: float) -> float:
+        '''Seconds until key has a token, without taking one.'''
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                return 0.0
+            tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            return 0.0 if tokens >= 1.0 else (1.0 - tokens) / self.rate
+
+    def take(self, key: Any, now: Optional[float] = None) -> float:
+        '''0.0 when a token was taken, otherwise seconds until one is available.'''
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= self.max_keys:
+                    self._buckets.popitem(last=False)
+                bucket = self._buckets[key] = [self.burst, now]
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+            if bucket[0] >= 1.0:
+                bucket[0] -= 1.0
+                return 0.0
+            return (1.0 - bucket[0]) / self.rate
+
+
+def parse_limits(spec: str) -> Dict[str, BucketTable]:
+    '''"user=5/20,ip=1" -> buckets; burst defaults to max(rate, 1).'''
+    tables = {}
+    for part in filter(None, (p.strip() for p in spec.split(','))):
+        scope, _, value = part.partition('=')
+        scope = scope.strip()
+        if scope not in SCOPES:
+            raise ValueError(f'Unknown admission scope {scope!r}, expected one of {", ".join(SCOPES)}')
+        rate, _, burst = value.partition('/')
+        rate = float(rate)
+        if rate <= 0:
+            continue
+        tables[scope] = BucketTable(rate, float(burst) if burst else max(rate, 1.0))
+    return tables
+
+
+class Policy:
+    '''The bucket tables of one (function, action); empty when the action is unlimited.'''
+
+    def __init__(self, function: str, action: Optional[str], default: str = ''):
+        env = f'ADMISSION_{function}_{action or "default"}'.upper()
+        self.spec = os.environ.get(env, default)
+        self.tables = parse_limits(self.spec)
+
+    def check(self, keys: Dict[str, Any]) -> float:
+        '''
+        Every scope is checked before any token is taken, so a request refused
+        by one limit does not drain the caller's other buckets.
+        '''
+        now = time.monotonic()
+        buckets = [(self.tables[scope], keys[scope]) for scope in SCOPES
+                   if scope in self.tables and keys.get(scope) is not None]
+        wait = max((table.wait(key, now) for table, key in buckets), default=0.0)
+        if wait:
+            return wait
+        for table, key in buckets:
+            # Another thread may have taken the last token since the check
+            wait = table.take(key, now)
+            if wait:
+                return wait
+        return 0.0
+
+
+def client_ip(event: Dict[str, Any]) -> Optional[str]:
+    return ((event.get('requestContext') or {}).get('identity') or {}).get('sourceIp')
+
+
+def throttled(wait: float) -> Dict[str, Any]:
+    return {'statusCode': 429, 'headers': {**_HEADERS, 'Retry-After': str(max(1, math.ceil(wait)))},
+            'body': '{"error":"Too many requests"}'}
+
+
+OVERLOADED = {'statusCode': 503, 'headers': {**_HEADERS, 'Retry-After': '1'},
+              'body': '{"error":"Server busy, retry shortly"}'}
+
+
+class ConcurrencyLimit:
+    '''
+    Caps requests in flight across every router in the process. A request
+    waits at most queue_ms for a slot; past that it is shed with 503, so a
+    backlog never builds up in front of the pool.
+    '''
+
+    def __init__(self, limit: int, queue_ms: float):
+        self.limit = limit
+        self.queue = queue_ms / 1000
+        self._slots = threading.BoundedSemaphore(limit) if limit > 0 else None
+        self.shed = 0
+
+    def acquire(self) -> bool:
+        if self._slots is None:
+            return True
+        if self._slots.acquire(timeout=self.queue):
+            return True
+        self.shed += 1
+        return False
+
+    def release(self) -> None:
+        if self._slots is not None:
+            self._slots.release()
+
+
+concurrency = ConcurrencyLimit(MAX_CONCURRENT if ENABLED else 0, QUEUE_MS)
@@ -0,0 +1,54 @@
+'''
+Business: Opaque keyset pagination cursors
+Args: list of sort-key values of the last row on a page; the types each caller expects back
+Returns: url-safe token that decodes back to the same values
+'''
+
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Sequence
+
+INT_MAX = 2 ** 31 - 1
+
+
+def encode_cursor(values: List[Any]) -> str:
+    raw = json.dumps(values, default=str, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def _coerce(value: Any, kind: type) -> Any:
+    '''Values go straight into keyset predicates: anything Postgres would reject is refused here.'''
+    if kind is int:
+        if isinstance(value, int) and not isinstance(value, bool) and -INT_MAX - 1 <= value <= INT_MAX:
+            return value
+    elif isinstance(value, str) and '\x00' not in value:
+        try:
+            value.encode()
+            return datetime.fromisoformat(value) if kind is datetime else value
+        except ValueError:
+            pass
+    raise ValueError('Invalid cursor')
+
+
+def decode_cursor(token: Optional[str], kinds: Sequence[type]) -> Optional[List[Any]]:
+    '''kinds is one of int, str or datetime (an ISO string in the token) per value.'''
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor')
+    if not isinstance(values, list) or len(values) != len(kinds):
+        raise ValueError('Invalid cursor')
+    return [_coerce(value, kind) for value, kind in zip(values, kinds)]
+
+
+def page_size(value: Optional[str], default: int, maximum: int) -> int:
+    try:
+        size = int(value) if value else default
+    except ValueError:
+        raise ValueError('Invalid limit')
+    return max(1, min(size, maximum))
+
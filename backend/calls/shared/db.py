@@ -0,0 +1,197 @@
+'''
+Business: Warm PostgreSQL connection pool reused across function invocations
+Args: DATABASE_URL and optional DB_POOL_* environment variables
+Returns: psycopg2 connections with RealDictCursor, plus hit/miss and wait counters
+'''
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+import psycopg2
+import psycopg2.extensions
+from psycopg2.extras import RealDictCursor
+from shared.statements import registry as statements
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    '''
+    Bounded LIFO pool. Connections are recycled after max_age seconds of life
+    or max_idle seconds unused, and pinged before reuse when they sat idle
+    longer than ping_after seconds.
+    '''
+
+    def __init__(self, dsn: Optional[str], max_size: int = 5, max_age: float = 300.0,
+                 max_idle: float = 60.0, ping_after: float = 5.0, acquire_timeout: float = 5.0):
+        self.dsn = dsn
+        self.max_size = max_size
+        self.max_age = max_age
+        self.max_idle = max_idle
+        self.ping_after = ping_after
+        self.acquire_timeout = acquire_timeout
+        self._cond = threading.Condition()
+        self._idle: List[Tuple[Any, float, float]] = []
+        self._born: Dict[int, float] = {}
+        self._size = 0
+        self._counters: Dict[str, float] = {
+            'hits': 0,
+            'misses': 0,
+            'discarded': 0,
+            'timeouts': 0,
+            'waits': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0,
+        }
+
+    def _connect(self):
+        return psycopg2.connect(self.dsn, cursor_factory=RealDictCursor)
+
+    def _close(self, conn) -> None:
+        statements.forget(conn)
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _usable(self, conn, created: float, released: float) -> bool:
+        now = time.monotonic()
+        if conn.closed or now - created > self.max_age or now - released > self.max_idle:
+            return False
+        if now - released > self.ping_after:
+            try:
+                cur = conn.cursor()
+                cur.execute('SELECT 1')
+                cur.close()
+                conn.rollback()
+            except Exception:
+                return False
+        return True
+
+    def _checkout(self, deadline: float) -> Tuple[Any, float, float]:
+        started = time.monotonic()
+        waited = False
+        with self._cond:
+            while True:
+                if self._idle:
+                    entry = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    entry = (None, 0.0, 0.0)
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._counters['timeouts'] += 1
+                    raise PoolTimeout('Timed out waiting for a database connection')
+                waited = True
+                self._cond.wait(remaining)
+            if waited:
+                wait_time = time.monotonic() - started
+                self._counters['waits'] += 1
+                self._counters['wait_time_total'] += wait_time
+                self._counters['wait_time_max'] = max(self._counters['wait_time_max'], wait_time)
+        return entry
+
+    def _drop(self, conn) -> None:
+        self._close(conn)
+        with self._cond:
+            self._size -= 1
+            self._counters['discarded'] += 1
+            self._cond.notify()
+
+    def acquire(self, timeout: Optional[float] = None):
+        deadline = time.monotonic() + (self.acquire_timeout if timeout is None else timeout)
+        while True:
+            conn, created, released = self._checkout(deadline)
+            if conn is None:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self._counters['misses'] += 1
+                    self._born[id(conn)] = time.monotonic()
+                return conn
+            if self._usable(conn, created, released):
+                with self._cond:
+                    self._counters['hits'] += 1
+                    self._born[id(conn)] = created
+                return conn
+            self._drop(conn)
+
+    def release(self, conn, discard: bool = False) -> None:
+        if conn is None:
+            return
+        if not discard and not conn.closed:
+            status = conn.get_transaction_status()
+            if status in (psycopg2.extensions.TRANSACTION_STATUS_INTRANS,
+                          psycopg2.extensions.TRANSACTION_STATUS_INERROR):
+                try:
+                    conn.rollback()
+                except Exception:
+                    discard = True
+            elif status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                discard = True
+        now = time.monotonic()
+        with self._cond:
+            created = self._born.pop(id(conn), now)
+            if not (discard or conn.closed or now - created > self.max_age):
+                self._idle.append((conn, created, now))
+                self._cond.notify()
+                return
+        self._drop(conn)
+
+    def close_all(self) -> None:
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn, _, _ in idle:
+            self._close(conn)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            result: Dict[str, Any] = dict(self._counters)
+            result['size'] = self._size
+            result['idle'] = len(self._idle)
+            result['in_use'] = self._size - len(self._idle)
+            result['max_size'] = self.max_size
+        return result
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    os.environ.get('DATABASE_URL'),
+                    max_size=int(os.environ.get('DB_POOL_MAX_SIZE', '5')),
+                    max_age=float(os.environ.get('DB_POOL_MAX_AGE', '300')),
+                    max_idle=float(os.environ.get('DB_POOL_MAX_IDLE', '60')),
+                    ping_after=float(os.environ.get('DB_POOL_PING_AFTER', '5')),
+                    acquire_timeout=float(os.environ.get('DB_POOL_ACQUIRE_TIMEOUT', '5')),
+                )
+    return _pool
+
+
+@contextmanager
+def connection(timeout: Optional[float] = None) -> Iterator[Any]:
+    pool = get_pool()
+    conn = pool.acquire(timeout)
+    try:
+        yield conn
+    finally:
+        pool.release(conn)
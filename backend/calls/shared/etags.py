@@ -0,0 +1,85 @@
+'''
+Business: Conditional GET for per-user lists backed by user_versions stamps
+Args: cursor, user id and list kind (friends, requests, calls); the request event and its parsed paging parameters
+Returns: ETag strings, 304 responses and 200 responses carrying the ETag
+'''
+
+import hashlib
+import os
+import time
+from typing import Any, Dict, Optional, Tuple
+from shared import statements
+from shared.http import JSON_HEADERS, Request
+
+KINDS = ('friends', 'requests', 'calls')
+
+# friends includes last_seen, which presence updates without bumping a version;
+# folding a time window into the tag bounds how stale a cached list can get
+FRIENDS_MAX_AGE = int(os.environ.get('ETAG_FRIENDS_MAX_AGE', '60'))
+
+_EXPOSE = {'Cache-Control': 'private, no-cache', 'Access-Control-Expose-Headers': 'ETag'}
+
+
+_VERSIONS = {
+    kind: statements.prepare(f'etag_{kind}_version',
+                             f"SELECT {kind} AS version FROM user_versions WHERE user_id = %(user_id)s",
+                             {'user_id': 'int'})
+    for kind in KINDS
+}
+
+
+def current_version(cur, user_id: Any, kind: str) -> int:
+    if kind not in KINDS:
+        raise ValueError(f'Unknown version kind {kind}')
+    statements.execute(cur, _VERSIONS[kind], {'user_id': user_id})
+    row = cur.fetchone()
+    return row['version'] if row else 0
+
+
+def make_etag(kind: str, user_id: Any, version: int, max_age: int = 0, page: Tuple = ()) -> str:
+    '''page holds the normalized paging parameters, so every page of a list gets its own tag.'''
+    tag = f'{kind[0]}{user_id}.{version}'
+    if page:
+        tag += '.' + hashlib.blake2s(repr(page).encode(), digest_size=4).hexdigest()
+    if max_age > 0:
+        tag += f'.{int(time.time()) // max_age}'
+    return f'W/"{tag}"'
+
+
+def matches(event: Dict[str, Any], etag: str) -> bool:
+    headers = event.get('headers') or {}
+    value: Optional[str] = headers.get('if-none-match') or headers.get('If-None-Match')
+    if not value:
+        return False
+    if value.strip() == '*':
+        return True
+    # If-None-Match uses weak comparison: W/ prefixes are ignored
+    bare = etag[2:] if etag.startswith('W/') else etag
+    for candidate in value.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == bare:
+            return True
+    return False
+
+
+def not_modified(etag: str) -> Dict[str, Any]:
+    return {'statusCode': 304, 'headers': {**JSON_HEADERS, **_EXPOSE, 'ETag': etag}, 'body': ''}
+
+
+def tagged(response: Dict[str, Any], etag: str) -> Dict[str, Any]:
+    response['headers'] = {**response['headers'], **_EXPOSE, 'ETag': etag}
+    return response
+
+
+def check(req: Request, kind: str, max_age: int = 0, page: Tuple = ()) -> Tuple[str, Optional[Dict[str, Any]]]:
+    '''
+    Reads the caller's version before the list query, so a write that lands
+    in between makes the next request miss rather than serve a stale 304.
+    Returns (etag, 304 response or None).
+    '''
+    etag = make_etag(kind, req.user_id, current_version(req.cur, req.user_id, kind), max_age, page)
+    if matches(req.event, etag):
+        return etag, not_modified(etag)
+    return etag, None
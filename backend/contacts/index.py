@@ -4,207 +4,478 @@ Args: event with httpMethod, body, headers (X-User-Id)
 Returns: HTTP response with contacts, requests, or search results
 '''
 
-import json
-import os
-from typing import Dict, Any
-import psycopg2
-from psycopg2.extras import RealDictCursor
+import io
+from datetime import datetime
+from typing import Callable, Dict, Any, List, Optional, Tuple
+from shared import etags, statements
+from shared.cursors import encode_cursor, decode_cursor, page_size
+from shared.export import Export, FORMATS
+from shared.friend_graph import get_graph, peek_graph
+from shared.http import JSON_HEADERS, Router, Request, ok, error
 
-def get_db_connection():
-    dsn = os.environ.get('DATABASE_URL')
-    return psycopg2.connect(dsn, cursor_factory=RealDictCursor)
+router = Router(
+    'contacts',
+    allow_headers='Content-Type, X-User-Id, If-None-Match',
+    default_get='friends',
+    conflict_message='Request already exists'
+)
 
-def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
-    method: str = event.get('httpMethod', 'GET')
-    
-    if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': ''
-        }
-    
-    headers = event.get('headers', {})
-    user_id = headers.get('x-user-id') or headers.get('X-User-Id')
-    
-    if not user_id:
-        return {
-            'statusCode': 401,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Unauthorized'})
-        }
-    
+# Served while the in-memory friend graph is still loading
+GRAPH_WARMING = {**error(503, 'Suggestions are warming up, retry shortly'),
+                 'headers': {**JSON_HEADERS, 'Retry-After': '10', 'Access-Control-Expose-Headers': 'Retry-After'}}
+
+# The friends page is sorted in memory after the join, so one statement with
+# an optional keyset plans as well generically as per cursor
+FRIENDS_PAGE = statements.prepare('contacts_friends_page', """
+    SELECT u.id, u.display_name, u.email, u.avatar_url, u.last_seen,
+           COALESCE(u.last_seen, 'epoch'::timestamp) AS seen_key
+    FROM friend_adjacency a
+    INNER JOIN users u ON u.id = a.friend_id
+    WHERE a.user_id = %(user_id)s
+      AND (%(seen)s IS NULL OR (COALESCE(u.last_seen, 'epoch'::timestamp), u.id) < (%(seen)s::timestamp, %(id)s))
+    ORDER BY seen_key DESC, u.id DESC
+    LIMIT %(limit)s
+""", {'user_id': 'int', 'seen': 'timestamp', 'id': 'int', 'limit': 'int'})
+
+PENDING_REQUESTS = statements.prepare('contacts_pending_requests', """
+    SELECT fr.id, fr.sender_id, fr.status, fr.created_at,
+           u.display_name, u.email, u.avatar_url
+    FROM friend_requests fr
+    INNER JOIN users u ON u.id = fr.sender_id
+    WHERE fr.receiver_id = %(user_id)s AND fr.status = 'pending'
+    ORDER BY fr.created_at DESC
+""", {'user_id': 'int'})
+
+EXPORT_COLUMNS = ['id', 'display_name', 'email', 'avatar_url', 'last_seen', 'friends_since']
+
+# friend_adjacency's primary key returns the rows in friend_id order
+EXPORT_SQL = """
+    SELECT u.id, u.display_name, u.email, u.avatar_url, u.last_seen, a.created_at AS friends_since
+    FROM friend_adjacency a
+    INNER JOIN users u ON u.id = a.friend_id
+    WHERE a.user_id = %(user_id)s AND a.friend_id > %(after)s
+    ORDER BY a.friend_id
+"""
+
+BULK_LIMIT = 1000
+IMPORT_LIMIT = 50000
+
+def parse_id_list(value: Any) -> Tuple[List[int], List[Any]]:
+    ids: List[int] = []
+    invalid: List[Any] = []
+    seen = set()
+    for item in value if isinstance(value, list) else []:
+        try:
+            item_id = int(item)
+        except (TypeError, ValueError):
+            invalid.append(item)
+            continue
+        if item_id not in seen:
+            seen.add(item_id)
+            ids.append(item_id)
+    return ids, invalid
+
+def normalize_emails(value: Any) -> Tuple[List[str], int]:
+    emails = set()
+    invalid = 0
+    for item in value if isinstance(value, list) else []:
+        email = item.strip().lower() if isinstance(item, str) else ''
+        # COPY text format treats backslash, tab and newline specially
+        if '@' not in email or len(email) > 255 or any(c in email for c in '\\\t\n\r '):
+            invalid += 1
+            continue
+        emails.add(email)
+    return sorted(emails), invalid
+
+def escape_like(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+@router.route('GET', 'friends')
+def friends(req: Request) -> Dict[str, Any]:
+    try:
+        limit = page_size(req.params.get('limit'), 100, 500)
+        after = decode_cursor(req.params.get('cursor'), (datetime, int)) or [None, None]
+    except ValueError as e:
+        return error(400, str(e))
+
+    etag, cached = etags.check(req, 'friends', etags.FRIENDS_MAX_AGE, page=(limit, *after))
+    if cached:
+        return cached
+
+    statements.execute(req.cur, FRIENDS_PAGE, {'user_id': req.user_id, 'seen': after[0], 'id': after[1], 'limit': limit + 1})
+    rows = req.cur.fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor([last['seen_key'].isoformat(), last['id']])
+    for f in rows:
+        del f['seen_key']
+
+    return etags.tagged(ok({'friends': rows, 'next_cursor': next_cursor}), etag)
+
+@router.route('GET', 'export', db=False)
+def export(req: Request) -> Dict[str, Any]:
+    fmt = req.params.get('format', 'ndjson')
+    if fmt not in FORMATS:
+        return error(400, 'Invalid format, expected ndjson or csv')
+    try:
+        after = int(req.params.get('after') or 0)
+        limit = page_size(req.params['limit'], 1, 10 ** 9) if req.params.get('limit') else None
+    except ValueError:
+        return error(400, 'Invalid after or limit')
+
+    job = Export('contacts_export', EXPORT_SQL, {'user_id': req.user_id, 'after': after}, EXPORT_COLUMNS, fmt,
+                 lambda row: str(row['id']))
+    return job.response(req.event, limit)
+
+@router.route('GET', 'requests')
+def pending_requests(req: Request) -> Dict[str, Any]:
+    etag, cached = etags.check(req, 'requests')
+    if cached:
+        return cached
+
+    statements.execute(req.cur, PENDING_REQUESTS, {'user_id': req.user_id})
+
+    return etags.tagged(ok({'requests': req.cur.fetchall()}), etag)
+
+@router.route('GET', 'suggestions')
+def suggestions(req: Request) -> Dict[str, Any]:
+    try:
+        limit = page_size(req.params.get('limit'), 20, 100)
+    except ValueError as e:
+        return error(400, str(e))
+
+    req.cur.execute("""
+        SELECT receiver_id AS id FROM friend_requests WHERE sender_id = %(user_id)s AND status = 'pending'
+        UNION
+        SELECT sender_id FROM friend_requests WHERE receiver_id = %(user_id)s AND status = 'pending'
+    """, {'user_id': req.user_id})
+    pending = [r['id'] for r in req.cur.fetchall()]
+
+    graph = get_graph(req.conn)
+    if graph is None:
+        return GRAPH_WARMING
+    ranked = graph.suggest(int(req.user_id), limit, pending)
+    mutual_counts = dict(ranked)
+    rows = []
+    if ranked:
+        req.cur.execute(
+            "SELECT id, display_name, email, avatar_url FROM users WHERE id = ANY(%s)",
+            ([candidate for candidate, _ in ranked],)
+        )
+        rows = req.cur.fetchall()
+        for u in rows:
+            u['mutual_friends'] = mutual_counts[u['id']]
+        rows.sort(key=lambda u: (-u['mutual_friends'], u['id']))
+
+    return ok({'suggestions': rows})
+
+@router.route('GET', 'mutual')
+def mutual(req: Request) -> Dict[str, Any]:
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        
-        if method == 'GET':
-            params = event.get('queryStringParameters', {})
-            action = params.get('action', 'friends')
-            
-            if action == 'friends':
-                cur.execute("""
-                    SELECT u.id, u.display_name, u.email, u.avatar_url, u.last_seen
-                    FROM users u
-                    INNER JOIN friendships f ON (f.user1_id = u.id OR f.user2_id = u.id)
-                    WHERE (f.user1_id = %s OR f.user2_id = %s) AND u.id != %s
-                    ORDER BY u.last_seen DESC
-                """, (user_id, user_id, user_id))
-                friends = cur.fetchall()
-                
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'friends': [dict(f) for f in friends]}, default=str)
-                }
-            
-            elif action == 'requests':
-                cur.execute("""
-                    SELECT fr.id, fr.sender_id, fr.status, fr.created_at,
-                           u.display_name, u.email, u.avatar_url
-                    FROM friend_requests fr
-                    INNER JOIN users u ON u.id = fr.sender_id
-                    WHERE fr.receiver_id = %s AND fr.status = 'pending'
-                    ORDER BY fr.created_at DESC
-                """, (user_id,))
-                requests = cur.fetchall()
-                
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'requests': [dict(r) for r in requests]}, default=str)
-                }
-            
-            elif action == 'search':
-                query = params.get('q', '')
-                if len(query) < 2:
-                    return {
-                        'statusCode': 400,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'error': 'Query too short'})
-                    }
-                
-                search_pattern = f'%{query}%'
-                cur.execute("""
-                    SELECT id, display_name, email, avatar_url
-                    FROM users
-                    WHERE (display_name ILIKE %s OR email ILIKE %s) AND id != %s
-                    LIMIT 20
-                """, (search_pattern, search_pattern, user_id))
-                results = cur.fetchall()
-                
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'results': [dict(r) for r in results]}, default=str)
-                }
-        
-        elif method == 'POST':
-            body = json.loads(event.get('body', '{}'))
-            action = body.get('action')
-            
-            if action == 'send_request':
-                receiver_id = body.get('receiver_id')
-                
-                if not receiver_id:
-                    return {
-                        'statusCode': 400,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'error': 'Missing receiver_id'})
-                    }
-                
-                cur.execute(
-                    "INSERT INTO friend_requests (sender_id, receiver_id) VALUES (%s, %s) RETURNING id",
-                    (user_id, receiver_id)
-                )
-                request_id = cur.fetchone()['id']
-                conn.commit()
-                
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'success': True, 'request_id': request_id})
-                }
-            
-            elif action == 'accept_request':
-                request_id = body.get('request_id')
-                
-                cur.execute(
-                    "SELECT sender_id, receiver_id FROM friend_requests WHERE id = %s AND receiver_id = %s AND status = 'pending'",
-                    (request_id, user_id)
-                )
-                request = cur.fetchone()
-                
-                if not request:
-                    return {
-                        'statusCode': 404,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'error': 'Request not found'})
-                    }
-                
-                user1 = min(request['sender_id'], request['receiver_id'])
-                user2 = max(request['sender_id'], request['receiver_id'])
-                
-                cur.execute(
-                    "INSERT INTO friendships (user1_id, user2_id) VALUES (%s, %s)",
-                    (user1, user2)
-                )
-                cur.execute(
-                    "UPDATE friend_requests SET status = 'accepted', updated_at = CURRENT_TIMESTAMP WHERE id = %s",
-                    (request_id,)
-                )
-                conn.commit()
-                
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'success': True})
-                }
-            
-            elif action == 'reject_request':
-                request_id = body.get('request_id')
-                
-                cur.execute(
-                    "UPDATE friend_requests SET status = 'rejected', updated_at = CURRENT_TIMESTAMP WHERE id = %s AND receiver_id = %s",
-                    (request_id, user_id)
-                )
-                conn.commit()
-                
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'success': True})
-                }
-        
-        return {
-            'statusCode': 405,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Method not allowed'})
-        }
-    
-    except psycopg2.IntegrityError:
-        if conn:
-            conn.rollback()
-        return {
-            'statusCode': 409,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Request already exists'})
-        }
-    except Exception as e:
-        if conn:
-            conn.rollback()
-        return {
-            'statusCode': 500,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': str(e)})
-        }
-    finally:
-        if cur:
-            cur.close()
-        if conn:
-            conn.close()
+        other_id = int(req.params.get('user_id', ''))
+    except ValueError:
+        return error(400, 'Missing user_id')
+
+    graph = get_graph(req.conn)
+    if graph is None:
+        # Until the graph has loaded, one merge of the two adjacency ranges answers it
+        req.cur.execute("""
+            SELECT u.id, u.display_name, u.email, u.avatar_url
+            FROM friend_adjacency a
+            INNER JOIN friend_adjacency b ON b.user_id = %(other_id)s AND b.friend_id = a.friend_id
+            INNER JOIN users u ON u.id = a.friend_id
+            WHERE a.user_id = %(user_id)s
+            ORDER BY u.id
+        """, {'user_id': req.user_id, 'other_id': other_id})
+        rows = req.cur.fetchall()
+        return ok({'mutual': rows, 'count': len(rows)})
+
+    mutual_ids = graph.mutual(int(req.user_id), other_id)
+    rows = []
+    if mutual_ids:
+        req.cur.execute(
+            "SELECT id, display_name, email, avatar_url FROM users WHERE id = ANY(%s) ORDER BY id",
+            (mutual_ids,)
+        )
+        rows = req.cur.fetchall()
+
+    return ok({'mutual': rows, 'count': len(mutual_ids)})
+
+@router.route('GET', 'search', limits='user=5/20,ip=20/60')
+def search(req: Request) -> Dict[str, Any]:
+    query = req.params.get('q', '').strip().lower()
+    if len(query) < 2:
+        return error(400, 'Query too short')
+
+    try:
+        limit = page_size(req.params.get('limit'), 20, 50)
+        after = decode_cursor(req.params.get('cursor'), (int, str, int)) or [-1, '', 0]
+    except ValueError as e:
+        return error(400, str(e))
+
+    prefix = escape_like(query) + '%'
+    pattern = prefix if len(query) < 3 else '%' + prefix
+    req.cur.execute("""
+        SELECT id, display_name, email, avatar_url, rank, sort_name
+        FROM (
+            SELECT id, display_name, email, avatar_url,
+                   lower(display_name) AS sort_name,
+                   CASE
+                       WHEN lower(display_name) = %(query)s OR lower(email) = %(query)s THEN 0
+                       WHEN lower(display_name) LIKE %(prefix)s OR lower(email) LIKE %(prefix)s THEN 1
+                       ELSE 2
+                   END AS rank
+            FROM users
+            WHERE (lower(display_name) LIKE %(pattern)s OR lower(email) LIKE %(pattern)s)
+              AND id != %(user_id)s
+        ) matches
+        WHERE (rank, sort_name, id) > (%(rank)s, %(name)s, %(id)s)
+        ORDER BY rank, sort_name, id
+        LIMIT %(limit)s
+    """, {
+        'query': query, 'prefix': prefix, 'pattern': pattern, 'user_id': req.user_id,
+        'rank': after[0], 'name': after[1], 'id': after[2], 'limit': limit + 1
+    })
+    results = req.cur.fetchall()
+
+    next_cursor = None
+    if len(results) > limit:
+        results = results[:limit]
+        last = results[-1]
+        next_cursor = encode_cursor([last['rank'], last['sort_name'], last['id']])
+    for r in results:
+        del r['rank'], r['sort_name']
+
+    return ok({'results': results, 'next_cursor': next_cursor})
+
+@router.route('POST', 'send_request')
+def send_request(req: Request) -> Dict[str, Any]:
+    receiver_id = req.body.get('receiver_id')
+
+    if not receiver_id:
+        return error(400, 'Missing receiver_id')
+
+    req.cur.execute(
+        "INSERT INTO friend_requests (sender_id, receiver_id) VALUES (%s, %s) RETURNING id",
+        (req.user_id, receiver_id)
+    )
+    request_id = req.cur.fetchone()['id']
+    req.conn.commit()
+
+    return ok({'success': True, 'request_id': request_id})
+
+@router.route('POST', 'accept_request')
+def accept_request(req: Request) -> Dict[str, Any]:
+    request_id = req.body.get('request_id')
+
+    req.cur.execute(
+        "SELECT sender_id, receiver_id FROM friend_requests WHERE id = %s AND receiver_id = %s AND status = 'pending'",
+        (request_id, req.user_id)
+    )
+    request = req.cur.fetchone()
+
+    if not request:
+        return error(404, 'Request not found')
+
+    user1 = min(request['sender_id'], request['receiver_id'])
+    user2 = max(request['sender_id'], request['receiver_id'])
+
+    req.cur.execute(
+        "INSERT INTO friendships (user1_id, user2_id) VALUES (%s, %s)",
+        (user1, user2)
+    )
+    req.cur.execute(
+        "UPDATE friend_requests SET status = 'accepted', updated_at = CURRENT_TIMESTAMP WHERE id = %s",
+        (request_id,)
+    )
+    req.conn.commit()
+
+    graph = peek_graph()
+    if graph is not None:
+        graph.add_edge(user1, user2)
+
+    return ok({'success': True})
+
+@router.route('POST', 'reject_request')
+def reject_request(req: Request) -> Dict[str, Any]:
+    request_id = req.body.get('request_id')
+
+    req.cur.execute(
+        "UPDATE friend_requests SET status = 'rejected', updated_at = CURRENT_TIMESTAMP WHERE id = %s AND receiver_id = %s",
+        (request_id, req.user_id)
+    )
+    req.conn.commit()
+
+    return ok({'success': True})
+
+def bulk(req: Request, key: str, item_key: str,
+         run: Callable[[Request, List[int]], Dict[int, Dict[str, Any]]],
+         on_commit: Optional[Callable[[Dict[int, Dict[str, Any]]], None]] = None) -> Dict[str, Any]:
+    ids, invalid = parse_id_list(req.body.get(key))
+
+    if not ids and not invalid:
+        return error(400, f'Missing {key}')
+    if len(ids) + len(invalid) > BULK_LIMIT:
+        return error(400, f'At most {BULK_LIMIT} ids per batch')
+
+    outcome = run(req, ids) if ids else {}
+    req.conn.commit()
+    if on_commit is not None:
+        on_commit(outcome)
+
+    results = [dict({item_key: i}, **outcome[i]) for i in ids]
+    results += [{item_key: v, 'success': False, 'error': 'Invalid id'} for v in invalid]
+    succeeded = sum(1 for r in results if r['success'])
+
+    return ok({'results': results, 'succeeded': succeeded, 'failed': len(results) - succeeded})
+
+def run_send_requests(req: Request, ids: List[int]) -> Dict[int, Dict[str, Any]]:
+    req.cur.execute("""
+        WITH input AS (
+            SELECT DISTINCT unnest(%(ids)s::int[]) AS receiver_id
+        ), inserted AS (
+            INSERT INTO friend_requests (sender_id, receiver_id)
+            SELECT %(user_id)s, i.receiver_id
+            FROM input i
+            INNER JOIN users u ON u.id = i.receiver_id
+            WHERE i.receiver_id <> %(user_id)s
+            ON CONFLICT (sender_id, receiver_id) DO NOTHING
+            RETURNING id, receiver_id
+        )
+        SELECT i.receiver_id AS id, ins.id AS request_id,
+               EXISTS (SELECT 1 FROM users u WHERE u.id = i.receiver_id) AS user_exists
+        FROM input i
+        LEFT JOIN inserted ins ON ins.receiver_id = i.receiver_id
+    """, {'ids': ids, 'user_id': req.user_id})
+
+    outcome: Dict[int, Dict[str, Any]] = {}
+    for row in req.cur.fetchall():
+        if row['request_id'] is not None:
+            outcome[row['id']] = {'success': True, 'request_id': row['request_id']}
+        elif row['id'] == int(req.user_id):
+            outcome[row['id']] = {'success': False, 'error': 'Cannot send request to yourself'}
+        elif not row['user_exists']:
+            outcome[row['id']] = {'success': False, 'error': 'User not found'}
+        else:
+            outcome[row['id']] = {'success': False, 'error': 'Request already exists'}
+    return outcome
+
+def run_accept_requests(req: Request, ids: List[int]) -> Dict[int, Dict[str, Any]]:
+    req.cur.execute("""
+        WITH input AS (
+            SELECT DISTINCT unnest(%(ids)s::int[]) AS id
+        ), accepted AS (
+            UPDATE friend_requests fr
+            SET status = 'accepted', updated_at = CURRENT_TIMESTAMP
+            FROM input i
+            WHERE fr.id = i.id AND fr.receiver_id = %(user_id)s AND fr.status = 'pending'
+            RETURNING fr.id, fr.sender_id, fr.receiver_id
+        ), befriended AS (
+            INSERT INTO friendships (user1_id, user2_id)
+            SELECT DISTINCT LEAST(sender_id, receiver_id), GREATEST(sender_id, receiver_id)
+            FROM accepted
+            WHERE sender_id <> receiver_id
+            ON CONFLICT (user1_id, user2_id) DO NOTHING
+        )
+        SELECT i.id, a.id IS NOT NULL AS done, a.sender_id
+        FROM input i
+        LEFT JOIN accepted a ON a.id = i.id
+    """, {'ids': ids, 'user_id': req.user_id})
+
+    return {
+        row['id']: {'success': True, 'sender_id': row['sender_id']} if row['done'] else {'success': False, 'error': 'Request not found'}
+        for row in req.cur.fetchall()
+    }
+
+def run_reject_requests(req: Request, ids: List[int]) -> Dict[int, Dict[str, Any]]:
+    req.cur.execute("""
+        WITH input AS (
+            SELECT DISTINCT unnest(%(ids)s::int[]) AS id
+        ), rejected AS (
+            UPDATE friend_requests fr
+            SET status = 'rejected', updated_at = CURRENT_TIMESTAMP
+            FROM input i
+            WHERE fr.id = i.id AND fr.receiver_id = %(user_id)s AND fr.status = 'pending'
+            RETURNING fr.id
+        )
+        SELECT i.id, r.id IS NOT NULL AS done
+        FROM input i
+        LEFT JOIN rejected r ON r.id = i.id
+    """, {'ids': ids, 'user_id': req.user_id})
+
+    return {
+        row['id']: {'success': True} if row['done'] else {'success': False, 'error': 'Request not found'}
+        for row in req.cur.fetchall()
+    }
+
+@router.route('POST', 'send_requests')
+def send_requests(req: Request) -> Dict[str, Any]:
+    return bulk(req, 'receiver_ids', 'receiver_id', run_send_requests)
+
+@router.route('POST', 'accept_requests')
+def accept_requests(req: Request) -> Dict[str, Any]:
+    def add_edges(outcome: Dict[int, Dict[str, Any]]) -> None:
+        graph = peek_graph()
+        if graph is not None:
+            for result in outcome.values():
+                if result['success']:
+                    graph.add_edge(result['sender_id'], int(req.user_id))
+
+    return bulk(req, 'request_ids', 'request_id', run_accept_requests, add_edges)
+
+@router.route('POST', 'reject_requests')
+def reject_requests(req: Request) -> Dict[str, Any]:
+    return bulk(req, 'request_ids', 'request_id', run_reject_requests)
+
+@router.route('POST', 'import_contacts')
+def import_contacts(req: Request) -> Dict[str, Any]:
+    emails, invalid = normalize_emails(req.body.get('emails'))
+    send = bool(req.body.get('send_requests'))
+
+    if not emails and not invalid:
+        return error(400, 'Missing emails')
+    if len(emails) + invalid > IMPORT_LIMIT:
+        return error(400, f'At most {IMPORT_LIMIT} emails per import')
+
+    # COPY the whole address book into a temp table and resolve it
+    # with one join against the email index
+    req.cur.execute("CREATE TEMP TABLE import_emails (email TEXT PRIMARY KEY) ON COMMIT DROP")
+    req.cur.copy_expert("COPY import_emails (email) FROM STDIN", io.StringIO('\n'.join(emails)))
+    req.cur.execute("ANALYZE import_emails")
+    req.cur.execute("""
+        WITH matched AS (
+            SELECT u.id, u.email, u.display_name, u.avatar_url
+            FROM import_emails e
+            INNER JOIN users u ON lower(u.email) = e.email
+            WHERE u.id <> %(user_id)s
+        ), requested AS (
+            INSERT INTO friend_requests (sender_id, receiver_id)
+            SELECT %(user_id)s, m.id
+            FROM matched m
+            WHERE %(send)s AND NOT EXISTS (
+                SELECT 1 FROM friend_adjacency a WHERE a.user_id = %(user_id)s AND a.friend_id = m.id
+            )
+            ON CONFLICT (sender_id, receiver_id) DO NOTHING
+            RETURNING receiver_id
+        )
+        SELECT m.id, m.email, m.display_name, m.avatar_url, r.receiver_id IS NOT NULL AS requested
+        FROM matched m
+        LEFT JOIN requested r ON r.receiver_id = m.id
+        ORDER BY m.id
+    """, {'user_id': req.user_id, 'send': send})
+    matches = req.cur.fetchall()
+    req.conn.commit()
+
+    return ok({
+        'matches': matches,
+        'submitted': len(emails) + invalid,
+        'invalid': invalid,
+        'matched': len(matches),
+        'requests_sent': sum(1 for m in matches if m['requested'])
+    })
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    return router.dispatch(event, context)
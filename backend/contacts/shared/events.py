@@ -0,0 +1,111 @@
+'''
+Business: Process-wide LISTEN on the user_events channel for long-polling waiters
+Args: DATABASE_URL; waiters subscribe by user id
+Returns: threading.Event per waiter that is set when that user gets a new event
+'''
+
+import os
+import select
+import threading
+import time
+from typing import Dict, Optional, Set
+import psycopg2
+import psycopg2.extensions
+
+CHANNEL = 'user_events'
+
+
+class EventListener:
+    '''
+    One dedicated connection per process listens for every user and wakes only
+    the waiters of the user named in the notification payload.
+    '''
+
+    def __init__(self, dsn: Optional[str]):
+        self.dsn = dsn
+        self._lock = threading.Lock()
+        self._waiters: Dict[int, Set[threading.Event]] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+
+    def subscribe(self, user_id: int) -> threading.Event:
+        self._ensure_started()
+        event = threading.Event()
+        with self._lock:
+            self._waiters.setdefault(user_id, set()).add(event)
+        return event
+
+    def unsubscribe(self, user_id: int, event: threading.Event) -> None:
+        with self._lock:
+            waiters = self._waiters.get(user_id)
+            if waiters is not None:
+                waiters.discard(event)
+                if not waiters:
+                    del self._waiters[user_id]
+
+    def wait_ready(self, timeout: float) -> bool:
+        return self._ready.wait(timeout)
+
+    def _ensure_started(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='event-listener', daemon=True)
+                self._thread.start()
+
+    def _wake(self, user_id: Optional[int]) -> None:
+        with self._lock:
+            if user_id is None:
+                targets = [e for events in self._waiters.values() for e in events]
+            else:
+                targets = list(self._waiters.get(user_id, ()))
+        for event in targets:
+            event.set()
+
+    def _run(self) -> None:
+        backoff = 0.5
+        while True:
+            conn = None
+            try:
+                conn = psycopg2.connect(self.dsn)
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                conn.cursor().execute(f'LISTEN {CHANNEL}')
+                self._ready.set()
+                # Anything published while we were disconnected is only visible
+                # by re-reading the table, so let every waiter re-check
+                self._wake(None)
+                backoff = 0.5
+                while True:
+                    if select.select([conn], [], [], 30.0) == ([], [], []):
+                        conn.cursor().execute('SELECT 1')
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        note = conn.notifies.pop(0)
+                        user_id, _, _ = note.payload.partition(':')
+                        try:
+                            self._wake(int(user_id))
+                        except ValueError:
+                            continue
+            except Exception:
+                self._ready.clear()
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 10.0)
+            finally:
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+
+
+_listener: Optional[EventListener] = None
+_listener_lock = threading.Lock()
+
+
+def get_listener() -> EventListener:
+    global _listener
+    if _listener is None:
+        with _listener_lock:
+            if _listener is None:
+                _listener = EventListener(os.environ.get('DATABASE_URL'))
+    return _listener
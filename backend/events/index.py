@@ -0,0 +1,77 @@
+'''
+Business: Long-poll for incoming calls and friend requests
+Args: event with httpMethod, headers (X-User-Id), queryStringParameters (after, timeout)
+Returns: HTTP response with events newer than the cursor, or an empty list on timeout
+'''
+
+import os
+import time
+from typing import Dict, Any, List
+from shared.db import connection
+from shared.events import get_listener
+from shared.http import Router, Request, ok, error
+
+MAX_WAIT = float(os.environ.get('EVENTS_MAX_WAIT', '25'))
+RECHECK_INTERVAL = 5.0
+BATCH_LIMIT = 100
+
+router = Router('events', allow_headers='Content-Type, X-User-Id', default_get='wait', allow_methods='GET, OPTIONS')
+
+def fetch_events(user_id: int, after: int) -> List[Dict[str, Any]]:
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT id, kind, payload, created_at
+            FROM user_events
+            WHERE user_id = %s AND id > %s
+            ORDER BY id
+            LIMIT %s
+        """, (user_id, after, BATCH_LIMIT))
+        rows = cur.fetchall()
+        cur.close()
+    return rows
+
+def latest_event_id(user_id: int) -> int:
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT COALESCE(MAX(id), 0) AS id FROM user_events WHERE user_id = %s", (user_id,))
+        latest = cur.fetchone()['id']
+        cur.close()
+    return latest
+
+@router.route('GET', 'wait', db=False)
+def wait(req: Request) -> Dict[str, Any]:
+    try:
+        user_id = int(req.user_id)
+        after = req.params.get('after')
+        timeout = min(max(float(req.params.get('timeout', MAX_WAIT)), 0.0), MAX_WAIT)
+        after = int(after) if after else None
+    except ValueError:
+        return error(400, 'Invalid after or timeout')
+
+    # Without a cursor the client starts from "now" and gets nothing back
+    if after is None:
+        return ok({'events': [], 'cursor': latest_event_id(user_id)})
+
+    listener = get_listener()
+    waiter = listener.subscribe(user_id)
+    try:
+        listener.wait_ready(1.0)
+        deadline = time.monotonic() + timeout
+        events = fetch_events(user_id, after)
+        while not events:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            # The periodic re-check covers notifications lost while the listener reconnects
+            waiter.wait(min(remaining, RECHECK_INTERVAL))
+            waiter.clear()
+            events = fetch_events(user_id, after)
+    finally:
+        listener.unsubscribe(user_id, waiter)
+
+    cursor = events[-1]['id'] if events else after
+    return ok({'events': events, 'cursor': cursor})
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    return router.dispatch(event, context)
@@ -0,0 +1,322 @@
+'''
+Business: Self-hosted HTTP server that runs every backend function in one warm process
+Args: --host, --port, --functions, --workers, --poll-workers, --keep-alive, --grace, --trusted-proxies; DATABASE_URL
+Returns: serves /<function>?... by turning each HTTP request into the event dict the handler expects
+'''
+
+import argparse
+import base64
+import importlib.util
+import ipaddress
+import os
+import signal
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Union
+from urllib.parse import parse_qsl, urlsplit
+
+BACKEND = Path(__file__).resolve().parent
+if str(BACKEND) not in sys.path:
+    sys.path.insert(0, str(BACKEND))
+
+# Long polls hold their slot for up to EVENTS_MAX_WAIT, so they get a separate limit
+POLL_FUNCTIONS = ('events',)
+MAX_BODY = int(os.environ.get('HOST_MAX_BODY', str(10 * 1024 * 1024)))
+
+Handler = Callable[[Dict[str, Any], Any], Dict[str, Any]]
+Network = Union[ipaddress.IPv4Network, ipaddress.IPv6Network]
+
+
+def discover_functions() -> List[str]:
+    return sorted(p.parent.name for p in BACKEND.glob('*/index.py') if p.parent.name != 'shared')
+
+
+def load_handler(function: str) -> Handler:
+    path = BACKEND / function / 'index.py'
+    spec = importlib.util.spec_from_file_location(f'{function}_index', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.handler
+
+
+class Context:
+    __slots__ = ('function_name', 'request_id')
+
+    def __init__(self, function_name: str):
+        self.function_name = function_name
+        self.request_id = uuid.uuid4().hex
+
+
+class Mount:
+    '''A loaded handler plus the semaphore that caps how many of its invocations run at once.'''
+
+    def __init__(self, name: str, handler: Handler, slots: threading.Semaphore):
+        self.name = name
+        self.handler = handler
+        self.slots = slots
+
+
+class FunctionHost(ThreadingHTTPServer):
+    '''
+    One thread per connection, so idle keep-alive connections cost a blocked
+    thread but no worker slot; handler invocations are capped per mount and
+    wait up to queue_timeout for a slot before answering 503.
+    '''
+
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, address, mounts: Dict[str, Mount], keep_alive: float, queue_timeout: float,
+                 trusted_proxies: Optional[List[Network]] = None):
+        self.mounts = mounts
+        self.trusted_proxies = trusted_proxies or []
+        self.keep_alive = keep_alive
+        self.queue_timeout = queue_timeout
+        self.draining = False
+        self._active = 0
+        self._idle = threading.Condition()
+        super().__init__(address, RequestHandler)
+
+    def enter(self) -> None:
+        with self._idle:
+            self._active += 1
+
+    def leave(self) -> None:
+        with self._idle:
+            self._active -= 1
+            if not self._active:
+                self._idle.notify_all()
+
+    def wait_idle(self, timeout: float) -> bool:
+        deadline = time.monotonic() + timeout
+        with self._idle:
+            while self._active:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._idle.wait(remaining)
+        return True
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'FunctionHost/1.0'
+    server: FunctionHost
+
+    def setup(self) -> None:
+        # Idle keep-alive connections are closed after this many seconds
+        self.timeout = self.server.keep_alive
+        super().setup()
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        self.invoke()
+
+    do_HEAD = do_POST = do_PUT = do_DELETE = do_PATCH = do_OPTIONS = do_GET
+
+    def invoke(self) -> None:
+        url = urlsplit(self.path)
+        name, _, rest = url.path.lstrip('/').partition('/')
+        mount = self.server.mounts.get(name)
+
+        # The body cannot be skipped without a valid length, so errors here close the connection
+        header = self.headers.get('Content-Length')
+        try:
+            length = int(header) if header else 0
+        except ValueError:
+            length = -1
+        if length < 0:
+            self.send({'statusCode': 400, 'headers': {'Content-Type': 'application/json'},
+                       'body': '{"error":"Invalid Content-Length"}'}, close=True)
+            return
+        if length > MAX_BODY:
+            self.send({'statusCode': 413, 'headers': {'Content-Type': 'application/json'},
+                       'body': '{"error":"Request body too large"}'}, close=True)
+            return
+        raw = self.rfile.read(length) if length else b''
+
+        if mount is None:
+            self.send({'statusCode': 404, 'headers': {'Content-Type': 'application/json'},
+                       'body': '{"error":"Unknown function"}'})
+            return
+
+        if not mount.slots.acquire(timeout=self.server.queue_timeout):
+            self.send({'statusCode': 503, 'headers': {'Content-Type': 'application/json', 'Retry-After': '1'},
+                       'body': '{"error":"Server busy"}'})
+            return
+        self.server.enter()
+        try:
+            try:
+                response = mount.handler(self.event(url, rest, raw), Context(mount.name))
+            except Exception as e:
+                response = {'statusCode': 502, 'headers': {'Content-Type': 'application/json'},
+                            'body': '{"error":"Handler failed: %s"}' % type(e).__name__}
+            # Streamed bodies run while being sent, so the slot is held until the last byte
+            self.send(response)
+        finally:
+            mount.slots.release()
+            self.server.leave()
+
+    def event(self, url, rest: str, raw: bytes) -> Dict[str, Any]:
+        try:
+            body: Optional[str] = raw.decode('utf-8')
+            encoded = False
+        except UnicodeDecodeError:
+            body = base64.b64encode(raw).decode()
+            encoded = True
+        # Lower-case names like the platform gateway; repeated headers are joined
+        headers: Dict[str, str] = {}
+        for name, value in self.headers.items():
+            name = name.lower()
+            headers[name] = f'{headers[name]}, {value}' if name in headers else value
+        return {
+            # HEAD runs the GET route; send() drops the body
+            'httpMethod': 'GET' if self.command == 'HEAD' else self.command,
+            'path': '/' + rest,
+            'headers': headers,
+            'queryStringParameters': dict(parse_qsl(url.query, keep_blank_values=True)),
+            'body': body if raw else None,
+            'isBase64Encoded': encoded,
+            # Handlers may return a generator body, sent with chunked encoding
+            'requestContext': {'identity': {'sourceIp': self.client_ip()}, 'streaming': True},
+        }
+
+    def trusted(self, address: str) -> bool:
+        try:
+            ip = ipaddress.ip_address(address.strip())
+        except ValueError:
+            return False
+        return any(ip in network for network in self.server.trusted_proxies)
+
+    def client_ip(self) -> str:
+        '''
+        The peer address, unless the peer is a trusted proxy: then the nearest
+        X-Forwarded-For entry that is not itself a trusted proxy. Entries left
+        of that are client-supplied and ignored.
+        '''
+        peer = self.client_address[0]
+        if not self.trusted(peer):
+            return peer
+        forwarded = [a.strip() for h in self.headers.get_all('X-Forwarded-For') or [] for a in h.split(',')]
+        for address in reversed(forwarded):
+            if address and not self.trusted(address):
+                return address
+        return peer
+
+    def send(self, response: Dict[str, Any], close: bool = False) -> None:
+        body = response.get('body') or ''
+        if not isinstance(body, (str, bytes, bytearray)):
+            self.send_stream(response, body)
+            return
+        if response.get('isBase64Encoded'):
+            payload = base64.b64decode(body)
+        else:
+            payload = body.encode() if isinstance(body, str) else bytes(body)
+        close = close or self.server.draining
+        self.send_response(int(response.get('statusCode', 200)))
+        for key, value in (response.get('headers') or {}).items():
+            if key.lower() not in ('content-length', 'connection'):
+                self.send_header(key, str(value))
+        self.send_header('Content-Length', str(len(payload)))
+        if close:
+            self.send_header('Connection', 'close')
+            self.close_connection = True
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(payload)
+
+    def send_stream(self, response: Dict[str, Any], chunks: Iterator[str]) -> None:
+        self.send_response(int(response.get('statusCode', 200)))
+        for key, value in (response.get('headers') or {}).items():
+            if key.lower() not in ('content-length', 'connection', 'transfer-encoding'):
+                self.send_header(key, str(value))
+        self.send_header('Transfer-Encoding', 'chunked')
+        if self.server.draining:
+            self.send_header('Connection', 'close')
+            self.close_connection = True
+        self.end_headers()
+        try:
+            if self.command == 'HEAD':
+                return
+            for chunk in chunks:
+                data = chunk.encode() if isinstance(chunk, str) else chunk
+                if data:
+                    self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+            self.wfile.write(b'0\r\n\r\n')
+        except Exception:
+            # Headers are already sent: the only way to signal failure is to cut the connection
+            self.close_connection = True
+        finally:
+            # Closing the generator releases its database connection
+            close = getattr(chunks, 'close', None)
+            if close is not None:
+                close()
+
+
+def build(args) -> FunctionHost:
+    # One process shares one pool across functions: size it to the worker count
+    os.environ.setdefault('DB_POOL_MAX_SIZE', str(args.workers))
+    workers = threading.BoundedSemaphore(args.workers)
+    polls = threading.BoundedSemaphore(args.poll_workers)
+    mounts = {}
+    for name in args.functions.split(','):
+        name = name.strip()
+        mounts[name] = Mount(name, load_handler(name), polls if name in POLL_FUNCTIONS else workers)
+    trusted = [ipaddress.ip_network(p.strip(), strict=False) for p in args.trusted_proxies.split(',') if p.strip()]
+    return FunctionHost((args.host, args.port), mounts, args.keep_alive, args.queue_timeout, trusted)
+
+
+def drain(server: FunctionHost, grace: float) -> None:
+    '''Stop accepting, let in-flight requests finish, then flush write-behind state.'''
+    from shared.db import get_pool
+    from shared.presence import get_presence
+    server.draining = True
+    server.shutdown()
+    if not server.wait_idle(grace):
+        print(f'Shutdown: requests still running after {grace}s', file=sys.stderr)
+    server.server_close()
+    get_presence().close()
+    get_pool().close_all()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description='Serve the backend functions from one process')
+    parser.add_argument('--host', default=os.environ.get('HOST', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('PORT', '8000')))
+    parser.add_argument('--functions', default=','.join(discover_functions()))
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('HOST_WORKERS', '16')),
+                        help='concurrent handler invocations (long polls excluded)')
+    parser.add_argument('--poll-workers', type=int, default=int(os.environ.get('HOST_POLL_WORKERS', '256')),
+                        help='concurrent long polls')
+    parser.add_argument('--keep-alive', type=float, default=15.0, help='idle seconds before closing a connection')
+    parser.add_argument('--queue-timeout', type=float, default=5.0, help='seconds to wait for a worker before 503')
+    parser.add_argument('--grace', type=float, default=30.0, help='seconds to let requests finish on shutdown')
+    parser.add_argument('--trusted-proxies', default=os.environ.get('HOST_TRUSTED_PROXIES', ''),
+                        help='comma-separated proxy addresses/CIDRs whose X-Forwarded-For is believed')
+    args = parser.parse_args(argv)
+
+    server = build(args)
+    drainer = threading.Thread(target=drain, args=(server, args.grace), name='host-drain')
+
+    def stop(signum, frame):
+        # shutdown() blocks until serve_forever returns, so it cannot run on the serving thread
+        if not drainer.is_alive() and not server.draining:
+            drainer.start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    print(f'Serving {", ".join("/" + m for m in server.mounts)} on http://{args.host}:{server.server_address[1]}',
+          flush=True)
+    server.serve_forever()
+    drainer.join()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,5 @@
+'''
+Business: Code shared by the auth, calls, contacts and events functions
+Each function directory holds a committed copy of this package as `shared` so it is bundled on deploy;
+edit it here only, then run scripts/sync_shared.py (--check fails when a copy is stale)
+'''
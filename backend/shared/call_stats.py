@@ -0,0 +1,54 @@
+'''
+Business: Incremental per-user call statistics rollups
+Args: name of a CTE returning finished calls (caller_id, receiver_id, status, started_at, duration_seconds)
+Returns: SQL fragment that adds those calls to user_call_stats and user_call_stats_daily
+'''
+
+ROLLUP_CTES = """
+    rollup_sides AS (
+        SELECT caller_id AS user_id, 1 AS made, 0 AS received, status, started_at, duration_seconds
+        FROM {source}
+        UNION ALL
+        SELECT receiver_id, 0, 1, status, started_at, duration_seconds
+        FROM {source}
+        WHERE receiver_id <> caller_id
+    ), rollup_totals AS (
+        INSERT INTO user_call_stats AS s (user_id, calls_made, calls_received, answered, missed, seconds_total, updated_at)
+        SELECT user_id, SUM(made), SUM(received),
+               COUNT(*) FILTER (WHERE status = 'ended'),
+               COUNT(*) FILTER (WHERE status = 'missed'),
+               COALESCE(SUM(duration_seconds), 0),
+               CURRENT_TIMESTAMP
+        FROM rollup_sides
+        WHERE user_id IS NOT NULL
+        GROUP BY user_id
+        ON CONFLICT (user_id) DO UPDATE SET
+            calls_made = s.calls_made + EXCLUDED.calls_made,
+            calls_received = s.calls_received + EXCLUDED.calls_received,
+            answered = s.answered + EXCLUDED.answered,
+            missed = s.missed + EXCLUDED.missed,
+            seconds_total = s.seconds_total + EXCLUDED.seconds_total,
+            updated_at = EXCLUDED.updated_at
+        RETURNING 1
+    ), rollup_daily AS (
+        INSERT INTO user_call_stats_daily AS d (user_id, day, calls, answered, missed, seconds_total)
+        SELECT user_id, started_at::date, COUNT(*),
+               COUNT(*) FILTER (WHERE status = 'ended'),
+               COUNT(*) FILTER (WHERE status = 'missed'),
+               COALESCE(SUM(duration_seconds), 0)
+        FROM rollup_sides
+        WHERE user_id IS NOT NULL AND started_at IS NOT NULL
+        GROUP BY user_id, started_at::date
+        ON CONFLICT (user_id, day) DO UPDATE SET
+            calls = d.calls + EXCLUDED.calls,
+            answered = d.answered + EXCLUDED.answered,
+            missed = d.missed + EXCLUDED.missed,
+            seconds_total = d.seconds_total + EXCLUDED.seconds_total
+        RETURNING 1
+    )
+"""
+
+
+def with_rollup(source: str) -> str:
+    '''CTEs to append after `WITH <source> AS (...),`; the caller must also set stats_recorded.'''
+    return ROLLUP_CTES.replace('{source}', source)
@@ -0,0 +1,129 @@
+'''
+Business: Salted scrypt password hashing on a bounded worker pool
+Args: PASSWORD_SCRYPT_N, PASSWORD_SCRYPT_R, PASSWORD_SCRYPT_P cost parameters and
+      PASSWORD_HASH_WORKERS (defaults to the CPU count)
+Returns: versioned "scrypt$n$r$p$salt$hash" strings; legacy unsalted SHA-256 hex digests still verify
+'''
+
+import atexit
+import base64
+import hashlib
+import hmac
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+SCHEME = 'scrypt'
+SALT_BYTES = 16
+KEY_BYTES = 32
+
+
+class Hasher:
+    '''
+    Runs scrypt on a fixed number of threads. hashlib.scrypt releases the GIL,
+    so workers use separate cores. The bound caps both CPU and memory: each
+    hash holds 128 * n * r bytes (16 MiB at the defaults) while it runs.
+    '''
+
+    def __init__(self, n: int = 2 ** 14, r: int = 8, p: int = 1, workers: Optional[int] = None):
+        if n < 2 or n & (n - 1):
+            raise ValueError('PASSWORD_SCRYPT_N must be a power of two')
+        self.n = n
+        self.r = r
+        self.p = p
+        self.workers = workers or os.cpu_count() or 1
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._dummy: Optional[str] = None
+
+    def _derive(self, password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+        return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                              maxmem=256 * n * r * p + (1 << 20), dklen=KEY_BYTES)
+
+    def _run(self, fn, *args):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='password-hash')
+        return self._executor.submit(fn, *args).result()
+
+    def _hash(self, password: str) -> str:
+        salt = os.urandom(SALT_BYTES)
+        key = self._derive(password, salt, self.n, self.r, self.p)
+        return '$'.join((SCHEME, str(self.n), str(self.r), str(self.p), _b64(salt), _b64(key)))
+
+    def _verify(self, password: str, stored: str) -> Tuple[bool, bool]:
+        if stored.startswith(SCHEME + '$'):
+            try:
+                _, n, r, p, salt, key = stored.split('$')
+                n, r, p = int(n), int(r), int(p)
+                expected = _unb64(key)
+                salt_bytes = _unb64(salt)
+            except ValueError:
+                return False, False
+            actual = self._derive(password, salt_bytes, n, r, p)
+            if not hmac.compare_digest(actual, expected):
+                return False, False
+            return True, (n, r, p) != (self.n, self.r, self.p)
+        # Legacy unsalted SHA-256 hex digest from before versioned hashes
+        if len(stored) != 64 or not stored.isascii():
+            return False, False
+        legacy = hashlib.sha256(password.encode()).hexdigest()
+        return hmac.compare_digest(legacy, stored), True
+
+    def hash(self, password: str) -> str:
+        return self._run(self._hash, password)
+
+    def verify(self, password: str, stored: Optional[str]) -> Tuple[bool, bool]:
+        '''Returns (matches, needs_rehash). needs_rehash is set for legacy hashes and outdated cost parameters.'''
+        if not stored:
+            self.burn(password)
+            return False, False
+        return self._run(self._verify, password, stored)
+
+    def burn(self, password: str) -> None:
+        '''Spends one verification worth of CPU so unknown emails take as long as wrong passwords.'''
+        if self._dummy is None:
+            self._dummy = self._hash('')
+        self._run(self._verify, password, self._dummy)
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+
+def _b64(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def _unb64(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+_hasher: Optional[Hasher] = None
+_hasher_lock = threading.Lock()
+
+
+def get_hasher() -> Hasher:
+    global _hasher
+    if _hasher is None:
+        with _hasher_lock:
+            if _hasher is None:
+                workers = int(os.environ.get('PASSWORD_HASH_WORKERS', '0'))
+                _hasher = Hasher(
+                    n=int(os.environ.get('PASSWORD_SCRYPT_N', str(2 ** 14))),
+                    r=int(os.environ.get('PASSWORD_SCRYPT_R', '8')),
+                    p=int(os.environ.get('PASSWORD_SCRYPT_P', '1')),
+                    workers=workers or None,
+                )
+                atexit.register(_hasher.close)
+    return _hasher
+
+
+def hash_password(password: str) -> str:
+    return get_hasher().hash(password)
+
+
+def verify_password(password: str, stored: Optional[str]) -> Tuple[bool, bool]:
+    return get_hasher().verify(password, stored)
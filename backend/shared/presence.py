@@ -0,0 +1,135 @@
+'''
+Business: Write-behind buffer for users.last_seen
+Args: PRESENCE_FLUSH_INTERVAL (seconds, 0 flushes on every touch) and PRESENCE_MAX_BATCH
+Returns: one multi-row UPDATE per flush instead of one transaction per sign-in
+'''
+
+import atexit
+import os
+import threading
+import time
+from typing import Dict, Optional
+from shared.db import get_pool
+
+
+class PresenceBuffer:
+    '''
+    Collects the latest touch per user and writes them in one statement when
+    the batch is full, when the oldest touch is older than flush_interval, or
+    at process exit. last_seen therefore lags reality by at most flush_interval.
+    '''
+
+    def __init__(self, flush_interval: float = 5.0, max_batch: int = 500):
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending: Dict[int, float] = {}
+        self._oldest: Optional[float] = None
+        self._timer: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self._wake = threading.Event()
+        self.flushes = 0
+        self.flushed_rows = 0
+        self.failures = 0
+
+    def touch(self, user_id: int, seen_at: Optional[float] = None) -> None:
+        seen_at = time.time() if seen_at is None else seen_at
+        with self._lock:
+            if seen_at > self._pending.get(user_id, 0.0):
+                self._pending[user_id] = seen_at
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            due = (len(self._pending) >= self.max_batch
+                   or time.monotonic() - self._oldest >= self.flush_interval)
+        self._ensure_timer()
+        if due:
+            self._wake.set()
+
+    def _ensure_timer(self) -> None:
+        if self._timer is not None and self._timer.is_alive():
+            return
+        with self._lock:
+            if self._timer is not None and self._timer.is_alive():
+                return
+            self._timer = threading.Thread(target=self._run, name='presence-flush', daemon=True)
+            self._timer.start()
+
+    def _run(self) -> None:
+        # Flushing happens here rather than in touch() so a request holding
+        # the last pooled connection never waits on its own presence write
+        while not self._stopped.is_set():
+            self._wake.wait(self.flush_interval or None)
+            self._wake.clear()
+            if self._pending:
+                try:
+                    self.flush()
+                except Exception:
+                    pass
+
+    def flush(self) -> int:
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+                self._oldest = None
+            if not batch:
+                return 0
+            user_ids = list(batch.keys())
+            seen = [batch[u] for u in user_ids]
+            pool = get_pool()
+            conn = None
+            try:
+                conn = pool.acquire()
+                cur = conn.cursor()
+                cur.execute("""
+                    UPDATE users u
+                    SET last_seen = to_timestamp(v.seen)::timestamp
+                    FROM unnest(%s::int[], %s::float8[]) AS v(id, seen)
+                    WHERE u.id = v.id
+                      AND (u.last_seen IS NULL OR u.last_seen < to_timestamp(v.seen)::timestamp)
+                """, (user_ids, seen))
+                cur.close()
+                conn.commit()
+            except Exception:
+                self.failures += 1
+                with self._lock:
+                    for user_id, seen_at in batch.items():
+                        if seen_at > self._pending.get(user_id, 0.0):
+                            self._pending[user_id] = seen_at
+                    if self._oldest is None:
+                        self._oldest = time.monotonic()
+                raise
+            finally:
+                pool.release(conn)
+            self.flushes += 1
+            self.flushed_rows += len(user_ids)
+            return len(user_ids)
+
+    def close(self) -> None:
+        self._stopped.set()
+        self._wake.set()
+        try:
+            self.flush()
+        except Exception:
+            pass
+
+
+_buffer: Optional[PresenceBuffer] = None
+_buffer_lock = threading.Lock()
+
+
+def get_presence() -> PresenceBuffer:
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = PresenceBuffer(
+                    flush_interval=float(os.environ.get('PRESENCE_FLUSH_INTERVAL', '5')),
+                    max_batch=int(os.environ.get('PRESENCE_MAX_BATCH', '500')),
+                )
+                atexit.register(_buffer.close)
+    return _buffer
+
+
+def touch(user_id: int) -> None:
+    get_presence().touch(user_id)
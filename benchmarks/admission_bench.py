@@ -0,0 +1,117 @@
+'''
+Business: Latency of well-behaved users while one abusive client floods search or login, with and without admission control
+Args: --schema seeded by loadtest.py, --good clients, --think ms between their requests, --flood threads,
+      --flood-action search|login, --duration per phase, --pool connections, --max-concurrent
+Returns: p50/p95/p99 for the well-behaved clients in each phase and the status counts the flood received
+'''
+
+import argparse
+import json
+import os
+import random
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List
+from common import load_handler, point_handlers_at, print_row, summarize
+from loadtest import PASSWORD, SEARCH_TERMS
+
+
+def get(action: str, user_id: int, ip: str, **params) -> Dict[str, Any]:
+    return {'httpMethod': 'GET', 'headers': {'X-User-Id': str(user_id)},
+            'queryStringParameters': {'action': action, **params},
+            'requestContext': {'identity': {'sourceIp': ip}}}
+
+
+def login(email: str, ip: str) -> Dict[str, Any]:
+    return {'httpMethod': 'POST', 'headers': {}, 'body': json.dumps({'action': 'login', 'email': email,
+                                                                      'password': PASSWORD}),
+            'requestContext': {'identity': {'sourceIp': ip}}}
+
+
+def run_phase(handlers, args, flood: bool) -> Dict[str, Any]:
+    deadline = time.monotonic() + args.duration
+    good: List[float] = []
+    good_status: Counter = Counter()
+    flood_status: Counter = Counter()
+    lock = threading.Lock()
+
+    def well_behaved(index: int) -> None:
+        rng = random.Random(index)
+        user_id = 1 + index
+        ip = f'10.0.{index // 250}.{index % 250 + 1}'
+        local = []
+        statuses: Counter = Counter()
+        while time.monotonic() < deadline:
+            if rng.random() < 0.5:
+                event, handler = get('friends', user_id, ip), handlers['contacts']
+            else:
+                event, handler = get('search', user_id, ip, q=rng.choice(SEARCH_TERMS)), handlers['contacts']
+            started = time.perf_counter()
+            statuses[handler(event, None)['statusCode']] += 1
+            local.append((time.perf_counter() - started) * 1000)
+            time.sleep(args.think / 1000)
+        with lock:
+            good.extend(local)
+            good_status.update(statuses)
+
+    def abusive(index: int) -> None:
+        rng = random.Random(10000 + index)
+        local: Counter = Counter()
+        while time.monotonic() < deadline:
+            if args.flood_action == 'login':
+                # Credential stuffing: a new account on every attempt, all from one address
+                response = handlers['auth'](login(f'user{rng.randint(1, 10 ** 6)}@example.com', '203.0.113.7'), None)
+            else:
+                response = handlers['contacts'](get('search', 999999, '203.0.113.7', q=rng.choice(SEARCH_TERMS)), None)
+            # A scripted client: ignores Retry-After and sends the next request at once
+            local[response['statusCode']] += 1
+        with lock:
+            flood_status.update(local)
+
+    threads = [threading.Thread(target=well_behaved, args=(i,)) for i in range(args.good)]
+    if flood:
+        threads += [threading.Thread(target=abusive, args=(i,)) for i in range(args.flood)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return {'good': summarize(good), 'good_status': {str(k): v for k, v in sorted(good_status.items())},
+            'flood_status': {str(k): v for k, v in sorted(flood_status.items())}}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--schema', default='bench_load')
+    parser.add_argument('--good', type=int, default=32)
+    # Well-behaved clients stay inside the default search limit of 5/s per user
+    parser.add_argument('--think', type=float, default=400.0)
+    parser.add_argument('--flood', type=int, default=32)
+    parser.add_argument('--flood-action', choices=('search', 'login'), default='search')
+    parser.add_argument('--duration', type=float, default=20.0)
+    parser.add_argument('--pool', type=int, default=8)
+    parser.add_argument('--max-concurrent', type=int, default=8)
+    parser.add_argument('--queue-ms', type=float, default=50.0)
+    args = parser.parse_args()
+
+    os.environ['DB_POOL_MAX_SIZE'] = str(args.pool)
+    point_handlers_at(args.schema)
+    handlers = {name: load_handler(name) for name in ('auth', 'contacts')}
+    from shared import admission
+
+    # Router reads both module attributes per request, so phases can switch them in place
+    admission.concurrency = admission.ConcurrencyLimit(args.max_concurrent, args.queue_ms)
+    phases = (('baseline, no flood', False, False), ('flood, admission off', True, False),
+              ('flood, admission on', True, True))
+    report = {}
+    for label, flood, enabled in phases:
+        admission.ENABLED = enabled
+        result = run_phase(handlers, args, flood)
+        print_row(f'{label}: good clients', result['good'])
+        print(f"{'':<40} good statuses {result['good_status']}, flood statuses {result['flood_status']}")
+        report[label] = result
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
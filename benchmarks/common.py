@@ -0,0 +1,110 @@
+'''
+Business: Helpers shared by the backend benchmarks
+Args: BENCH_DATABASE_URL (falls back to DATABASE_URL) pointing at a scratch database
+Returns: connections scoped to a throwaway schema and latency summaries
+'''
+
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+ROOT = Path(__file__).resolve().parent.parent
+MIGRATIONS = ROOT / 'db_migrations'
+BACKEND = ROOT / 'backend'
+
+if str(BACKEND) not in sys.path:
+    sys.path.insert(0, str(BACKEND))
+
+
+def bench_dsn() -> str:
+    dsn = os.environ.get('BENCH_DATABASE_URL') or os.environ.get('DATABASE_URL')
+    if not dsn:
+        sys.exit('Set BENCH_DATABASE_URL to a scratch PostgreSQL database')
+    return dsn
+
+
+def connect_schema(schema: str, reset: bool = True):
+    '''Connect with search_path pinned to a dedicated schema, recreating it when reset is set.'''
+    conn = psycopg2.connect(bench_dsn(), cursor_factory=RealDictCursor)
+    conn.autocommit = True
+    cur = conn.cursor()
+    if reset:
+        cur.execute(f'DROP SCHEMA IF EXISTS {schema} CASCADE')
+    cur.execute(f'CREATE SCHEMA IF NOT EXISTS {schema}')
+    cur.execute(f'SET search_path TO {schema}, public')
+    cur.close()
+    return conn
+
+
+def apply_migrations(conn, upto: Optional[str] = None, after: Optional[str] = None) -> None:
+    cur = conn.cursor()
+    for path in sorted(MIGRATIONS.glob('V*.sql')):
+        version = path.name.split('__')[0]
+        if after and version <= after:
+            continue
+        if upto and version > upto:
+            break
+        cur.execute(path.read_text())
+    cur.close()
+
+
+def time_query(conn, sql: str, params: Any, repeat: int) -> List[float]:
+    cur = conn.cursor()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        cur.execute(sql, params)
+        cur.fetchall()
+        samples.append((time.perf_counter() - started) * 1000)
+    cur.close()
+    return samples
+
+
+def time_calls(fn: Callable[[], Any], repeat: int) -> List[float]:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    return {
+        'n': len(samples),
+        'mean_ms': round(statistics.fmean(samples), 3),
+        'p50_ms': round(percentile(samples, 50), 3),
+        'p95_ms': round(percentile(samples, 95), 3),
+        'p99_ms': round(percentile(samples, 99), 3),
+        'max_ms': round(max(samples), 3),
+    }
+
+
+def print_row(label: str, stats: Dict[str, float]) -> None:
+    print(f"{label:<40} p50={stats['p50_ms']:>9.3f}ms p95={stats['p95_ms']:>9.3f}ms p99={stats['p99_ms']:>9.3f}ms")
+
+
+def point_handlers_at(schema: str) -> None:
+    '''Make backend handlers loaded in this process use the benchmark schema.'''
+    os.environ['DATABASE_URL'] = bench_dsn()
+    os.environ['PGOPTIONS'] = f'-c search_path={schema},public'
+
+
+def load_handler(function: str) -> Callable[[Dict[str, Any], Any], Dict[str, Any]]:
+    import importlib.util
+    path = BACKEND / function / 'index.py'
+    spec = importlib.util.spec_from_file_location(f'{function}_index', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.handler
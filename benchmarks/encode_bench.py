@@ -0,0 +1,66 @@
+'''
+Business: Per-request CPU of response building before and after the shared http module
+Args: --rows per list, --repeat
+Returns: p50/p95/p99 for the legacy dict-copy + json.dumps(default=str) path and shared.http.ok
+'''
+
+import argparse
+import json
+from datetime import datetime, timedelta
+from common import print_row, summarize, time_calls
+from shared import http
+
+
+def friend_rows(n: int):
+    now = datetime(2024, 5, 1, 12, 0, 0, 123456)
+    return [{
+        'id': i,
+        'display_name': f'User {i}',
+        'email': f'user{i}@example.com',
+        'avatar_url': None,
+        'last_seen': now - timedelta(minutes=i),
+    } for i in range(n)]
+
+
+def call_rows(n: int):
+    now = datetime(2024, 5, 1, 12, 0, 0, 123456)
+    return [{
+        'id': i,
+        'status': 'ended',
+        'started_at': now - timedelta(minutes=5 * i),
+        'ended_at': now - timedelta(minutes=5 * i - 3),
+        'duration_seconds': 180,
+        'caller_id': 1,
+        'receiver_id': i,
+        'other_user_name': f'User {i}',
+        'other_user_avatar': None,
+    } for i in range(n)]
+
+
+def legacy(key, rows):
+    return {
+        'statusCode': 200,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps({key: [dict(r) for r in rows]}, default=str)
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"JSON backend: {'orjson' if http.orjson is not None else 'json (stdlib)'}")
+    report = {}
+    for key, rows in (('friends', friend_rows(args.rows)), ('calls', call_rows(args.rows))):
+        before = summarize(time_calls(lambda: legacy(key, rows), args.repeat))
+        after = summarize(time_calls(lambda: http.ok({key: rows}), args.repeat))
+        print_row(f'{key} x{args.rows} legacy', before)
+        print_row(f'{key} x{args.rows} shared.http', after)
+        report[key] = {'legacy': before, 'shared_http': after}
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
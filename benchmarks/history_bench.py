@@ -0,0 +1,102 @@
+'''
+Business: Compare call history latency before and after the composite history indexes
+Args: --calls (default 5000000), --users, --repeat
+Returns: p50/p95/p99 for the legacy CASE-join query and the paginated history action
+'''
+
+import argparse
+import json
+from common import (apply_migrations, connect_schema, load_handler, point_handlers_at,
+                    print_row, summarize, time_calls, time_query)
+
+SCHEMA = 'bench_history'
+
+LEGACY_SQL = """
+    SELECT c.id, c.status, c.started_at, c.ended_at, c.duration_seconds,
+           c.caller_id, c.receiver_id,
+           u.display_name as other_user_name, u.avatar_url as other_user_avatar
+    FROM calls c
+    INNER JOIN users u ON (
+        CASE
+            WHEN c.caller_id = %s THEN u.id = c.receiver_id
+            ELSE u.id = c.caller_id
+        END
+    )
+    WHERE c.caller_id = %s OR c.receiver_id = %s
+    ORDER BY c.started_at DESC
+    LIMIT 50
+"""
+
+SEED_USERS_SQL = """
+    INSERT INTO users (email, display_name)
+    SELECT 'user' || g || '@example.com', 'User ' || g FROM generate_series(1, %s) g
+"""
+
+# Users 1-10 are heavy callers that take part in roughly a fifth of all calls
+SEED_CALLS_SQL = """
+    INSERT INTO calls (caller_id, receiver_id, status, started_at, ended_at, duration_seconds)
+    SELECT CASE WHEN g %% 5 = 0 THEN 1 + g %% 10 ELSE 1 + (random() * (%(users)s - 1))::int END,
+           1 + (random() * (%(users)s - 1))::int,
+           'ended',
+           ts, ts + interval '3 minutes', 180
+    FROM (
+        SELECT g, TIMESTAMP '2021-01-01' + (g * interval '20 seconds') AS ts
+        FROM generate_series(1, %(calls)s) g
+    ) s
+"""
+
+
+def history_event(user_id: int, before: str = None):
+    params = {'action': 'history'}
+    if before:
+        params['before'] = before
+    return {'httpMethod': 'GET', 'headers': {'X-User-Id': str(user_id)}, 'queryStringParameters': params}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--calls', type=int, default=5000000)
+    parser.add_argument('--users', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    conn = connect_schema(SCHEMA)
+    apply_migrations(conn, upto='V0001')
+    cur = conn.cursor()
+    cur.execute(SEED_USERS_SQL, (args.users,))
+    cur.execute(SEED_CALLS_SQL, {'users': args.users, 'calls': args.calls})
+    cur.execute('ANALYZE')
+
+    report = {}
+    for label, user_id in (('heavy', 1), ('typical', args.users // 2)):
+        stats = summarize(time_query(conn, LEGACY_SQL, (user_id,) * 3, args.repeat))
+        print_row(f'legacy history {label}', stats)
+        report[f'legacy:{label}'] = stats
+
+    apply_migrations(conn, after='V0001')
+    cur.execute('ANALYZE')
+    point_handlers_at(SCHEMA)
+    handler = load_handler('calls')
+
+    for label, user_id in (('heavy', 1), ('typical', args.users // 2)):
+        stats = summarize(time_calls(lambda: handler(history_event(user_id), None), args.repeat))
+        print_row(f'history action {label}', stats)
+        report[f'paged:{label}'] = stats
+
+        # Walk 20 pages deep, then time the page after that
+        before = None
+        for _ in range(20):
+            page = json.loads(handler(history_event(user_id, before), None)['body'])
+            before = page['next_before']
+            if not before:
+                break
+        if before:
+            stats = summarize(time_calls(lambda: handler(history_event(user_id, before), None), args.repeat))
+            print_row(f'history action {label} page 21', stats)
+            report[f'paged:{label}:deep'] = stats
+    cur.close()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+'''
+Business: Requests/sec of the single-process host versus one process per invocation
+Args: --path and --method of the request, --schema seeded by loadtest.py (or --no-db for preflight only),
+      --concurrency, --duration, --workers, --cold invocations
+Returns: latency percentiles and requests/sec for warm keep-alive traffic and for cold per-invocation processes
+'''
+
+import argparse
+import http.client
+import json
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+from urllib.parse import parse_qsl, urlsplit
+from common import BACKEND, point_handlers_at, print_row, summarize
+
+COLD = '''
+import importlib.util, json, sys
+sys.path.insert(0, {backend!r})
+spec = importlib.util.spec_from_file_location('{function}_index', {path!r})
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+response = module.handler(json.loads(sys.argv[1]), None)
+sys.exit(0 if response['statusCode'] < 500 else 1)
+'''
+
+
+def warm(port: int, method: str, path: str, headers: Dict[str, str], concurrency: int, duration: float):
+    samples: List[float] = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def client() -> None:
+        conn = http.client.HTTPConnection('127.0.0.1', port)
+        local = []
+        failed = 0
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            conn.request(method, path, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            local.append((time.perf_counter() - started) * 1000)
+            if response.status >= 500:
+                failed += 1
+        conn.close()
+        with lock:
+            samples.extend(local)
+            errors[0] += failed
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return samples, errors[0], time.perf_counter() - started
+
+
+def cold(function: str, event: Dict, invocations: int, concurrency: int):
+    script = COLD.format(backend=str(BACKEND), function=function, path=str(BACKEND / function / 'index.py'))
+    payload = json.dumps(event)
+
+    def once(_) -> float:
+        started = time.perf_counter()
+        subprocess.run([sys.executable, '-c', script, payload], check=False)
+        return (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        samples = list(pool.map(once, range(invocations)))
+    return samples, time.perf_counter() - started
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--path', default='/calls?action=stats')
+    parser.add_argument('--method', default='GET')
+    parser.add_argument('--user', default='1')
+    parser.add_argument('--schema', default='bench_load')
+    parser.add_argument('--no-db', action='store_true', help='send CORS preflights, which need no database')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--cold', type=int, default=50)
+    args = parser.parse_args()
+
+    method = 'OPTIONS' if args.no_db else args.method
+    if not args.no_db:
+        point_handlers_at(args.schema)
+
+    import host
+    url = urlsplit(args.path)
+    function = url.path.strip('/').split('/')[0]
+    server = host.build(argparse.Namespace(
+        host='127.0.0.1', port=0, functions=function, workers=args.workers,
+        poll_workers=args.workers, keep_alive=15.0, queue_timeout=5.0, trusted_proxies='',
+    ))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    headers = {'X-User-Id': args.user}
+    samples, errors, elapsed = warm(server.server_address[1], method, args.path, headers,
+                                    args.concurrency, args.duration)
+    server.shutdown()
+    server.server_close()
+    warm_stats = summarize(samples)
+    warm_rps = len(samples) / elapsed
+    print_row(f'host {method} {args.path}', warm_stats)
+    print(f'  {warm_rps:.1f} req/s over {len(samples)} requests, {errors} errors')
+
+    event = {
+        'httpMethod': method,
+        'headers': headers,
+        'queryStringParameters': dict(parse_qsl(url.query)),
+        'body': None,
+    }
+    cold_samples, cold_elapsed = cold(function, event, args.cold, args.concurrency)
+    cold_stats = summarize(cold_samples)
+    cold_rps = len(cold_samples) / cold_elapsed
+    print_row(f'process per invocation {method}', cold_stats)
+    print(f'  {cold_rps:.1f} req/s over {len(cold_samples)} invocations')
+    print(f'speedup: {warm_rps / cold_rps:.1f}x')
+
+    print(json.dumps({
+        'host': dict(warm_stats, rps=round(warm_rps, 1), errors=errors),
+        'per_invocation': dict(cold_stats, rps=round(cold_rps, 1)),
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
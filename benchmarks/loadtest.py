@@ -0,0 +1,315 @@
+'''
+Business: In-process load test for the auth, calls, contacts and events handlers
+Args: --users/--friendships/--calls seed volumes, --mix action weights, --concurrency, --duration, --out, --baseline
+Returns: per-action p50/p95/p99 latency, throughput, error counts and queries per request, saved as JSON
+'''
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+from urllib.parse import parse_qsl, urlsplit
+import psycopg2
+from psycopg2.extras import RealDictCursor
+from common import BACKEND, apply_migrations, connect_schema, load_handler, point_handlers_at, summarize
+from shared.passwords import hash_password
+
+SCHEMA = 'bench_load'
+FUNCTIONS = ('auth', 'calls', 'contacts', 'events')
+PASSWORD = 'password123'
+SEARCH_TERMS = ['an', 'ivan', 'petrov', 'user12', 'gmail.com', 'olga smirnov']
+DEFAULT_MIX = ('contacts:friends=30,contacts:requests=15,contacts:search=15,calls:history=20,'
+               'calls:stats=5,calls:start_call=5,auth:login=10')
+
+SEED_USERS_SQL = """
+    INSERT INTO users (email, password_hash, display_name)
+    SELECT 'user' || g || '@' || (ARRAY['gmail.com', 'mail.ru', 'yandex.ru', 'corp.dev'])[1 + g %% 4],
+           %(password_hash)s,
+           initcap((ARRAY['anna', 'boris', 'ivan', 'olga', 'petr', 'maria', 'sergey', 'elena'])[1 + g %% 8])
+           || ' ' ||
+           initcap((ARRAY['ivanov', 'petrov', 'smirnov', 'kuznetsov', 'popov', 'volkov'])[1 + (g / 8) %% 6])
+    FROM generate_series(1, %(users)s) g
+"""
+
+SEED_FRIENDSHIPS_SQL = """
+    INSERT INTO friendships (user1_id, user2_id)
+    SELECT LEAST(a, b), GREATEST(a, b)
+    FROM (
+        SELECT 1 + (random() * (%(users)s - 1))::int AS a,
+               1 + (random() * (%(users)s - 1))::int AS b
+        FROM generate_series(1, %(friendships)s)
+    ) pairs
+    WHERE a <> b
+    ON CONFLICT DO NOTHING
+"""
+
+SEED_REQUESTS_SQL = """
+    INSERT INTO friend_requests (sender_id, receiver_id)
+    SELECT 1 + (random() * (%(users)s - 1))::int, 1 + (random() * (%(users)s - 1))::int
+    FROM generate_series(1, %(requests)s)
+    ON CONFLICT DO NOTHING
+"""
+
+# Calls end now and go back 30 seconds apiece, so the history window holds the
+# newest of them; the months they span get partitions first, not calls_default
+SEED_CALL_PARTITIONS_SQL = """
+    SELECT create_calls_partition(m::date)
+    FROM generate_series(date_trunc('month', LOCALTIMESTAMP - %(calls)s * interval '30 seconds'),
+                         date_trunc('month', LOCALTIMESTAMP), interval '1 month') m
+"""
+
+SEED_CALLS_SQL = """
+    INSERT INTO calls (caller_id, receiver_id, status, started_at, ended_at, duration_seconds, stats_recorded)
+    SELECT 1 + (random() * (%(users)s - 1))::int,
+           1 + (random() * (%(users)s - 1))::int,
+           'ended', ts, ts + interval '2 minutes', 120, FALSE
+    FROM (
+        SELECT LOCALTIMESTAMP - (g * interval '30 seconds') AS ts
+        FROM generate_series(1, %(calls)s) g
+    ) s
+"""
+
+_counter = threading.local()
+
+
+class CountingCursor(RealDictCursor):
+    def execute(self, query, vars=None):
+        _counter.queries = getattr(_counter, 'queries', 0) + 1
+        return super().execute(query, vars)
+
+
+def seed(conn, args) -> None:
+    cur = conn.cursor()
+    # One salted hash shared by every seeded user: logins measure steady-state verification
+    password_hash = hash_password(PASSWORD)
+    steps = (
+        ('users', SEED_USERS_SQL, {'users': args.users, 'password_hash': password_hash}),
+        ('friendships', SEED_FRIENDSHIPS_SQL, {'users': args.users, 'friendships': args.friendships}),
+        ('friend requests', SEED_REQUESTS_SQL, {'users': args.users, 'requests': args.requests}),
+        ('call partitions', SEED_CALL_PARTITIONS_SQL, {'calls': args.calls}),
+        ('calls', SEED_CALLS_SQL, {'users': args.users, 'calls': args.calls}),
+    )
+    for label, sql, params in steps:
+        started = time.perf_counter()
+        cur.execute(sql, params)
+        print(f'seeded {label} in {time.perf_counter() - started:.1f}s', flush=True)
+    cur.execute('ANALYZE')
+    cur.close()
+
+
+def unique_email(email: str, tag: str) -> str:
+    local, _, domain = email.partition('@')
+    return f'{local}+{tag}@{domain}'
+
+
+def event_from_test(test: Dict[str, Any], tag: str) -> Dict[str, Any]:
+    '''tag makes body emails unique per replay, so register and the login after it succeed every time.'''
+    url = urlsplit(test.get('path', '/'))
+    event = {
+        'httpMethod': test.get('method', 'GET'),
+        'headers': dict(test.get('headers', {})),
+        'queryStringParameters': dict(parse_qsl(url.query)),
+    }
+    if 'body' in test:
+        body = dict(test['body'])
+        if isinstance(body.get('email'), str):
+            body['email'] = unique_email(body['email'], tag)
+        event['body'] = json.dumps(body)
+    return event
+
+
+def scenario_requests(tag: str) -> List[Tuple[str, str, Dict[str, Any], int]]:
+    '''(function, test name, event, expected status) for every tests.json entry.'''
+    scenarios = []
+    for function in FUNCTIONS:
+        spec = json.loads((BACKEND / function / 'tests.json').read_text())
+        for test in spec.get('tests', []):
+            scenarios.append((function, test['name'], event_from_test(test, tag), test.get('expectedStatus', 200)))
+    return scenarios
+
+
+def workload(users: int) -> Dict[str, Callable[[random.Random], Dict[str, Any]]]:
+    def get(action: str, **params):
+        def build(rng: random.Random) -> Dict[str, Any]:
+            query = {'action': action}
+            query.update({k: v(rng) if callable(v) else v for k, v in params.items()})
+            return {'httpMethod': 'GET', 'headers': {'X-User-Id': str(rng.randint(1, users))},
+                    'queryStringParameters': query}
+        return build
+
+    def post(action: str, auth: bool = True, **fields):
+        def build(rng: random.Random) -> Dict[str, Any]:
+            body = {'action': action}
+            body.update({k: v(rng) if callable(v) else v for k, v in fields.items()})
+            headers = {'X-User-Id': str(rng.randint(1, users))} if auth else {}
+            return {'httpMethod': 'POST', 'headers': headers, 'body': json.dumps(body)}
+        return build
+
+    def email(rng: random.Random) -> str:
+        n = rng.randint(1, users)
+        return f"user{n}@{['gmail.com', 'mail.ru', 'yandex.ru', 'corp.dev'][n % 4]}"
+
+    return {
+        'contacts:friends': get('friends'),
+        'contacts:requests': get('requests'),
+        'contacts:search': get('search', q=lambda rng: rng.choice(SEARCH_TERMS)),
+        'contacts:suggestions': get('suggestions'),
+        'calls:history': get('history'),
+        'calls:stats': get('stats'),
+        'calls:current': get('current'),
+        'calls:start_call': post('start_call', receiver_id=lambda rng: rng.randint(1, users)),
+        'auth:login': post('login', auth=False, email=email, password=PASSWORD),
+    }
+
+
+def parse_mix(spec: str) -> List[Tuple[str, int]]:
+    mix = []
+    for part in spec.split(','):
+        name, _, weight = part.partition('=')
+        mix.append((name.strip(), int(weight or 1)))
+    return mix
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latency: Dict[str, List[float]] = defaultdict(list)
+        self.queries: Dict[str, int] = defaultdict(int)
+        self.status: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+
+    def call(self, name: str, handler, event: Dict[str, Any]) -> Dict[str, Any]:
+        _counter.queries = 0
+        started = time.perf_counter()
+        response = handler(event, None)
+        elapsed = (time.perf_counter() - started) * 1000
+        with self.lock:
+            self.latency[name].append(elapsed)
+            self.queries[name] += _counter.queries
+            self.status[name][response['statusCode']] += 1
+        return response
+
+    def report(self, seconds: float) -> Dict[str, Any]:
+        actions = {}
+        for name, samples in sorted(self.latency.items()):
+            stats = summarize(samples)
+            stats['throughput_rps'] = round(len(samples) / seconds, 1) if seconds else None
+            stats['queries_per_request'] = round(self.queries[name] / len(samples), 2)
+            stats['status'] = {str(k): v for k, v in sorted(self.status[name].items())}
+            actions[name] = stats
+        total = sum(len(s) for s in self.latency.values())
+        return {'requests': total, 'seconds': round(seconds, 2),
+                'throughput_rps': round(total / seconds, 1) if seconds else None, 'actions': actions}
+
+
+def print_report(title: str, report: Dict[str, Any]) -> None:
+    print(f"--- {title}: {report['requests']} requests in {report['seconds']}s ({report['throughput_rps']} rps)")
+    for name, s in report['actions'].items():
+        print(f"{name:<26} n={s['n']:>7} p50={s['p50_ms']:>8.2f} p95={s['p95_ms']:>8.2f} "
+              f"p99={s['p99_ms']:>8.2f}ms q/req={s['queries_per_request']:>5} status={s['status']}")
+
+
+def compare(current: Dict[str, Any], baseline_path: Path, threshold: float) -> bool:
+    baseline = json.loads(baseline_path.read_text())
+    regressed = False
+    print(f'--- compared with {baseline_path} (regression threshold {threshold:.0%})')
+    for phase in ('scenarios', 'mixed'):
+        for name, now in current[phase]['actions'].items():
+            before = baseline.get(phase, {}).get('actions', {}).get(name)
+            if not before:
+                continue
+            change = (now['p95_ms'] - before['p95_ms']) / before['p95_ms'] if before['p95_ms'] else 0.0
+            flag = 'REGRESSION' if change > threshold else ''
+            regressed = regressed or bool(flag)
+            print(f"{phase}:{name:<26} p95 {before['p95_ms']:>8.2f} -> {now['p95_ms']:>8.2f}ms ({change:+.0%}) {flag}")
+    return regressed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--friendships', type=int, default=1000000)
+    parser.add_argument('--requests', type=int, default=200000)
+    parser.add_argument('--calls', type=int, default=2000000)
+    parser.add_argument('--skip-seed', action='store_true', help='reuse the data of a previous run')
+    parser.add_argument('--mix', default=DEFAULT_MIX)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=30.0)
+    parser.add_argument('--scenario-repeat', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--out', default='loadtest-results.json')
+    parser.add_argument('--baseline', help='earlier --out file to compare p95 against')
+    parser.add_argument('--threshold', type=float, default=0.15)
+    args = parser.parse_args()
+
+    conn = connect_schema(SCHEMA, reset=not args.skip_seed)
+    if not args.skip_seed:
+        apply_migrations(conn)
+        seed(conn, args)
+    conn.close()
+
+    os.environ.setdefault('DB_POOL_MAX_SIZE', str(args.concurrency + 2))
+    # The mix logs in far faster than the login limits allow; admission_bench.py covers throttling
+    os.environ.setdefault('ADMISSION', '0')
+    point_handlers_at(SCHEMA)
+    handlers = {name: load_handler(name) for name in FUNCTIONS}
+
+    from shared.db import get_pool
+    pool = get_pool()
+    pool._connect = lambda: psycopg2.connect(pool.dsn, cursor_factory=CountingCursor)
+
+    recorder = Recorder()
+    started = time.perf_counter()
+    run = f'{os.getpid()}-{int(time.time())}'
+    for repeat in range(args.scenario_repeat):
+        for function, name, event, expected in scenario_requests(f'{run}-{repeat}'):
+            response = recorder.call(f'{function}:{name}', handlers[function], event)
+            if response['statusCode'] != expected:
+                print(f"{function}:{name}: expected {expected}, got {response['statusCode']}", file=sys.stderr)
+    scenarios = recorder.report(time.perf_counter() - started)
+    print_report('tests.json scenarios', scenarios)
+
+    generators = workload(args.users)
+    mix = parse_mix(args.mix)
+    unknown = [name for name, _ in mix if name not in generators]
+    if unknown:
+        sys.exit(f"unknown workload actions: {', '.join(unknown)}; known: {', '.join(sorted(generators))}")
+    names = [name for name, _ in mix]
+    weights = [weight for _, weight in mix]
+
+    recorder = Recorder()
+    deadline = time.monotonic() + args.duration
+
+    def worker(index: int) -> None:
+        rng = random.Random(args.seed * 1000 + index)
+        while time.monotonic() < deadline:
+            name = rng.choices(names, weights)[0]
+            recorder.call(name, handlers[name.split(':')[0]], generators[name](rng))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        list(executor.map(worker, range(args.concurrency)))
+    mixed = recorder.report(time.perf_counter() - started)
+    print_report(f'mixed workload, concurrency {args.concurrency}', mixed)
+
+    result = {
+        'config': {k: v for k, v in vars(args).items() if k not in ('out', 'baseline')},
+        'pool': pool.stats(),
+        'scenarios': scenarios,
+        'mixed': mixed,
+    }
+    Path(args.out).write_text(json.dumps(result, indent=2))
+    print(f'results written to {args.out}')
+
+    if args.baseline and compare(result, Path(args.baseline), args.threshold):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+'''
+Business: Call history and retention cost on one calls table versus monthly partitions (V0008)
+Args: --calls (default 10000000) spread over --years ending now, --users, --repeat
+Returns: p50/p95/p99 for history first and deep pages, end_call lookups, and removing the oldest month
+'''
+
+import argparse
+import json
+import time
+from common import (apply_migrations, connect_schema, load_handler, point_handlers_at,
+                    print_row, summarize, time_calls)
+from history_bench import SEED_USERS_SQL, history_event
+
+SCHEMA = 'bench_partition'
+
+# Same shape as history_bench, but ending now so the recent window has data
+SEED_CALLS_SQL = """
+    INSERT INTO calls (caller_id, receiver_id, status, started_at, ended_at, duration_seconds, stats_recorded)
+    SELECT CASE WHEN g %% 5 = 0 THEN 1 + g %% 10 ELSE 1 + (random() * (%(users)s - 1))::int END,
+           1 + (random() * (%(users)s - 1))::int,
+           'ended',
+           ts, ts + interval '3 minutes', 180, TRUE
+    FROM (
+        SELECT g, LOCALTIMESTAMP - (g * %(step)s * interval '1 second') AS ts
+        FROM generate_series(1, %(calls)s) g
+    ) s
+"""
+
+LOOKUP_SQL = {
+    'end_call lookup by id': "SELECT id FROM calls WHERE id = %(id)s",
+    'end_call lookup by id+started_at': "SELECT id FROM calls WHERE id = %(id)s AND started_at = %(ts)s",
+}
+
+
+def deep_cursor(handler, user_id: int, pages: int):
+    before = None
+    for _ in range(pages):
+        page = json.loads(handler(history_event(user_id, before), None)['body'])
+        before = page['next_before']
+        if not before:
+            break
+    return before
+
+
+def time_in_rollback(cur, sql: str) -> float:
+    cur.execute('BEGIN')
+    started = time.perf_counter()
+    cur.execute(sql)
+    elapsed = (time.perf_counter() - started) * 1000
+    cur.execute('ROLLBACK')
+    return elapsed
+
+
+def measure(handler, cur, args, phase: str, report) -> None:
+    for label, user_id in (('heavy', 1), ('typical', args.users // 2)):
+        stats = summarize(time_calls(lambda: handler(history_event(user_id), None), args.repeat))
+        print_row(f'{phase} history {label}', stats)
+        report[f'{phase}:{label}'] = stats
+        before = deep_cursor(handler, user_id, 20)
+        if before:
+            stats = summarize(time_calls(lambda: handler(history_event(user_id, before), None), args.repeat))
+            print_row(f'{phase} history {label} page 21', stats)
+            report[f'{phase}:{label}:deep'] = stats
+
+    cur.execute("SELECT id, started_at AS ts FROM calls ORDER BY started_at DESC LIMIT 1 OFFSET 1000")
+    recent = cur.fetchone()
+    for label, sql in LOOKUP_SQL.items():
+        samples = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            cur.execute(sql, recent)
+            cur.fetchall()
+            samples.append((time.perf_counter() - started) * 1000)
+        stats = summarize(samples)
+        print_row(f'{phase} {label}', stats)
+        report[f'{phase}:{label}'] = stats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--calls', type=int, default=10000000)
+    parser.add_argument('--years', type=float, default=3.0)
+    parser.add_argument('--users', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    conn = connect_schema(SCHEMA)
+    apply_migrations(conn, upto='V0007')
+    cur = conn.cursor()
+    cur.execute(SEED_USERS_SQL, (args.users,))
+    step = max(1, int(args.years * 365 * 86400 / args.calls))
+    cur.execute(SEED_CALLS_SQL, {'users': args.users, 'calls': args.calls, 'step': step})
+    cur.execute('ANALYZE')
+
+    point_handlers_at(SCHEMA)
+    handler = load_handler('calls')
+    from shared.db import get_pool
+
+    report = {}
+    measure(handler, cur, args, 'single table', report)
+    cur.execute("SELECT date_trunc('month', MIN(started_at)) AS lo FROM calls")
+    oldest = cur.fetchone()['lo']
+    elapsed = time_in_rollback(
+        cur, f"DELETE FROM calls WHERE started_at < TIMESTAMP '{oldest}' + interval '1 month'")
+    print(f"{'single table delete oldest month':<40} {elapsed:>9.1f}ms")
+    report['single table:retention_ms'] = elapsed
+
+    started = time.perf_counter()
+    apply_migrations(conn, after='V0007')
+    print(f"{'V0008 migration':<40} {time.perf_counter() - started:>9.1f}s")
+    # Pooled connections hold statements prepared against the old table
+    get_pool().close_all()
+    cur.execute('ANALYZE calls')
+
+    measure(handler, cur, args, 'partitioned', report)
+    name = 'calls_p' + oldest.strftime('%Y_%m')
+    elapsed = time_in_rollback(cur, f'ALTER TABLE calls DETACH PARTITION {name}; DROP TABLE {name}')
+    print(f"{'partitioned detach+drop oldest month':<40} {elapsed:>9.1f}ms")
+    report['partitioned:retention_ms'] = elapsed
+    cur.close()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
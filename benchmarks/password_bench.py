@@ -0,0 +1,70 @@
+'''
+Business: Password hashing cost versus login throughput, to pick scrypt parameters
+Args: --costs n:r:p list, --workers list, --logins per run, --repeat for latency samples
+Returns: per-cost single-login latency and logins/second overall and per core at each worker count
+'''
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
+from common import print_row, summarize, time_calls
+from shared.passwords import Hasher
+
+PASSWORD = 'correct horse battery staple'
+
+
+def parse_costs(value: str) -> List[Tuple[int, int, int]]:
+    costs = []
+    for item in value.split(','):
+        n, r, p = (int(part) for part in item.split(':'))
+        costs.append((n, r, p))
+    return costs
+
+
+def throughput(hasher: Hasher, stored: str, logins: int, clients: int) -> float:
+    # More client threads than workers, like concurrent handler threads queueing on the pool
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        results = list(pool.map(lambda _: hasher.verify(PASSWORD, stored), range(logins)))
+    elapsed = time.perf_counter() - started
+    assert all(ok for ok, _ in results)
+    return logins / elapsed
+
+
+def main() -> None:
+    cores = os.cpu_count() or 1
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--costs', default='8192:8:1,16384:8:1,32768:8:1,65536:8:1')
+    parser.add_argument('--workers', default=','.join(str(w) for w in sorted({1, max(1, cores // 2), cores})))
+    parser.add_argument('--logins', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=30)
+    args = parser.parse_args()
+
+    print(f'CPU cores: {cores}')
+    report = {'cores': cores, 'costs': []}
+    for n, r, p in parse_costs(args.costs):
+        label = f'n={n} r={r} p={p} ({128 * n * r // (1 << 20)} MiB)'
+        single = Hasher(n=n, r=r, p=p, workers=1)
+        stored = single.hash(PASSWORD)
+        latency = summarize(time_calls(lambda: single.verify(PASSWORD, stored), args.repeat))
+        single.close()
+        print_row(f'{label} verify', latency)
+
+        entry = {'n': n, 'r': r, 'p': p, 'verify': latency, 'throughput': []}
+        for workers in (int(w) for w in args.workers.split(',')):
+            hasher = Hasher(n=n, r=r, p=p, workers=workers)
+            rate = throughput(hasher, stored, args.logins, workers * 4)
+            hasher.close()
+            per_core = rate / min(workers, cores)
+            print(f'  workers={workers:<3} {rate:>9.1f} logins/s {per_core:>9.1f} logins/s/core')
+            entry['throughput'].append({'workers': workers, 'logins_per_s': round(rate, 1),
+                                        'logins_per_s_per_core': round(per_core, 1)})
+        report['costs'].append(entry)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
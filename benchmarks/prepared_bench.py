@@ -0,0 +1,118 @@
+'''
+Business: Planning time and latency of the friends and history queries, plain versus PREPAREd
+Args: --users/--friendships/--requests/--calls seed volumes, --samples users to query, --repeat
+Returns: planning-time and end-to-end p50/p95/p99 per query for plain execute and shared.statements EXECUTE
+'''
+
+import argparse
+import json
+import os
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+from common import apply_migrations, connect_schema, load_handler, print_row, summarize
+from loadtest import seed
+from shared.statements import StatementRegistry
+
+SCHEMA = 'bench_prepared'
+
+
+def planning_ms(cur, sql: str, params: Any) -> float:
+    cur.execute('EXPLAIN (ANALYZE, SUMMARY, FORMAT JSON) ' + sql, params)
+    row = cur.fetchone()
+    plan = row['QUERY PLAN'] if 'QUERY PLAN' in row else next(iter(row.values()))
+    return plan[0]['Planning Time']
+
+
+def run(conn, statement, param_sets: List[Dict[str, Any]], repeat: int) -> Dict[str, Any]:
+    cur = conn.cursor()
+    # A private registry, so this connection starts with nothing prepared
+    registry = StatementRegistry()
+    prepared = registry.register(statement.name, statement.sql, statement.types)
+
+    plain_plan, plain_wall, prep_plan, prep_wall = [], [], [], []
+    for i in range(repeat):
+        params = param_sets[i % len(param_sets)]
+        plain_plan.append(planning_ms(cur, statement.sql, params))
+        started = time.perf_counter()
+        cur.execute(statement.sql, params)
+        cur.fetchall()
+        plain_wall.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        registry.execute(cur, prepared, params)
+        cur.fetchall()
+        prep_wall.append((time.perf_counter() - started) * 1000)
+        prep_plan.append(planning_ms(cur, prepared.execute_sql, [params[p] for p in prepared.params]))
+    cur.execute(f'DEALLOCATE {prepared.name}')
+    cur.close()
+    return {
+        'plain_planning': summarize(plain_plan),
+        'plain_total': summarize(plain_wall),
+        'prepared_planning': summarize(prep_plan),
+        'prepared_total': summarize(prep_wall),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=50000)
+    parser.add_argument('--friendships', type=int, default=500000)
+    parser.add_argument('--requests', type=int, default=50000)
+    parser.add_argument('--calls', type=int, default=1000000)
+    parser.add_argument('--samples', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=300)
+    parser.add_argument('--skip-seed', action='store_true')
+    args = parser.parse_args()
+
+    conn = connect_schema(SCHEMA, reset=not args.skip_seed)
+    if not args.skip_seed:
+        apply_migrations(conn)
+        seed(conn, args)
+
+    # Loading the handlers registers their statements in the shared registry
+    load_handler('calls')
+    load_handler('contacts')
+    from shared.statements import registry
+
+    rng = random.Random(1)
+    users = [rng.randint(1, args.users) for _ in range(args.samples)]
+    cur = conn.cursor()
+    # A keyset cursor one page deep into each sampled caller's history
+    cur.execute("""
+        SELECT u AS caller_id, c.started_at, c.id
+        FROM unnest(%s::int[]) u,
+             LATERAL (SELECT started_at, id FROM calls WHERE caller_id = u
+                      ORDER BY started_at DESC, id DESC OFFSET 50 LIMIT 1) c
+    """, (users,))
+    cursors = cur.fetchall()
+    cur.close()
+
+    # The same window the history route searches first
+    since = datetime.now() - timedelta(days=int(os.environ.get('CALLS_HISTORY_WINDOW_DAYS', '90')))
+    cases = {
+        'friends page': (registry.get('contacts_friends_page'),
+                         [{'user_id': u, 'seen': None, 'id': None, 'limit': 101} for u in users]),
+        'history first page': (registry.get('calls_history_first_recent'),
+                               [{'user_id': u, 'limit': 51, 'since': since} for u in users]),
+        'history before': (registry.get('calls_history_before'),
+                           [{'user_id': c['caller_id'], 'ts': c['started_at'], 'id': c['id'], 'limit': 51}
+                            for c in cursors]),
+    }
+
+    report = {}
+    for label, (statement, param_sets) in cases.items():
+        if not param_sets:
+            continue
+        result = run(conn, statement, param_sets, args.repeat)
+        print_row(f'{label} plain planning', result['plain_planning'])
+        print_row(f'{label} prepared planning', result['prepared_planning'])
+        print_row(f'{label} plain total', result['plain_total'])
+        print_row(f'{label} prepared total', result['prepared_total'])
+        report[label] = result
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+'''
+Business: Compare contacts search latency before and after the trigram/prefix indexes
+Args: --sizes (default 10000,100000,1000000) and --repeat per query
+Returns: p50/p95/p99 per query term for the legacy ILIKE query and the search action
+'''
+
+import argparse
+import json
+import os
+from common import (apply_migrations, connect_schema, load_handler, point_handlers_at,
+                    print_row, summarize, time_calls, time_query)
+
+SCHEMA = 'bench_search'
+TERMS = ['an', 'ivan', 'petrov', 'user12345', 'gmail.com', 'zzqx']
+
+LEGACY_SQL = """
+    SELECT id, display_name, email, avatar_url
+    FROM users
+    WHERE (display_name ILIKE %s OR email ILIKE %s) AND id != %s
+    LIMIT 20
+"""
+
+SEED_SQL = """
+    INSERT INTO users (email, display_name)
+    SELECT 'user' || g || '@' || (ARRAY['gmail.com', 'mail.ru', 'yandex.ru', 'corp.dev'])[1 + g %% 4],
+           initcap((ARRAY['anna', 'boris', 'ivan', 'olga', 'petr', 'maria', 'sergey', 'elena', 'dmitry', 'nina'])[1 + g %% 10])
+           || ' ' ||
+           initcap((ARRAY['ivanov', 'petrov', 'smirnov', 'kuznetsov', 'popov', 'volkov', 'sokolov', 'lebedev'])[1 + (g / 10) %% 8])
+           || ' ' || g
+    FROM generate_series(%s, %s) g
+"""
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default='10000,100000,1000000')
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    conn = connect_schema(SCHEMA)
+    apply_migrations(conn)
+    point_handlers_at(SCHEMA)
+    # Repeating one user's searches would trip the search rate limit after the first burst
+    os.environ['ADMISSION'] = '0'
+    handler = load_handler('contacts')
+
+    def search(event):
+        response = handler(event, None)
+        assert response['statusCode'] == 200, response
+        return response
+
+    report = {}
+    seeded = 0
+    cur = conn.cursor()
+    for size in [int(s) for s in args.sizes.split(',')]:
+        cur.execute(SEED_SQL, (seeded + 1, size))
+        cur.execute('ANALYZE users')
+        seeded = size
+        print(f'--- {size} users')
+        for term in TERMS:
+            pattern = f'%{term}%'
+            legacy = summarize(time_query(conn, LEGACY_SQL, (pattern, pattern, 1), args.repeat))
+            event = {
+                'httpMethod': 'GET',
+                'headers': {'X-User-Id': '1'},
+                'queryStringParameters': {'action': 'search', 'q': term},
+            }
+            indexed = summarize(time_calls(lambda: search(event), args.repeat))
+            print_row(f'legacy ILIKE q={term}', legacy)
+            print_row(f'search action q={term}', indexed)
+            report[f'{size}:{term}'] = {'legacy': legacy, 'search': indexed}
+    cur.close()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+'''
+Business: Measure friend-of-friend suggestion latency and index size on a synthetic graph
+Args: --users, --edges (friendships), --queries, --locality (neighbourhood width)
+Returns: index memory, build time and p50/p95/p99 for suggest() and mutual()
+'''
+
+import argparse
+import json
+import random
+import time
+from array import array
+from common import print_row, summarize, time_calls
+from shared.friend_graph import FriendGraph
+
+
+def build_graph(users: int, edges: int, locality: int, seed: int) -> FriendGraph:
+    '''Counting-sort random local edges straight into CSR arrays; the rare duplicate edge is kept.'''
+    rng = random.Random(seed)
+    src = array('i')
+    dst = array('i')
+    for _ in range(edges):
+        a = rng.randint(1, users)
+        b = (a + rng.randint(1, locality) - 1) % users + 1
+        if a != b:
+            src.append(a)
+            dst.append(b)
+            src.append(b)
+            dst.append(a)
+
+    offsets = array('i', bytes(4 * (users + 2)))
+    for a in src:
+        offsets[a + 1] += 1
+    running = 0
+    for i in range(len(offsets)):
+        running += offsets[i]
+        offsets[i] = running
+
+    neighbors = array('i', bytes(4 * len(src)))
+    fill = array('i', offsets)
+    for a, b in zip(src, dst):
+        neighbors[fill[a]] = b
+        fill[a] += 1
+    del src, dst, fill
+
+    for u in range(1, users + 1):
+        lo, hi = offsets[u], offsets[u + 1]
+        if hi - lo > 1:
+            neighbors[lo:hi] = array('i', sorted(neighbors[lo:hi]))
+    return FriendGraph(offsets, neighbors)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=1000000)
+    parser.add_argument('--edges', type=int, default=10000000)
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--locality', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    graph = build_graph(args.users, args.edges, args.locality, args.seed)
+    build_seconds = time.perf_counter() - started
+    print(f'built {args.edges} friendships for {args.users} users in {build_seconds:.1f}s, '
+          f'index {graph.memory_bytes() / 2 ** 20:.1f} MiB')
+
+    rng = random.Random(args.seed + 1)
+    sample = [rng.randint(1, args.users) for _ in range(args.queries)]
+    it = iter(sample)
+    suggest = summarize(time_calls(lambda: graph.suggest(next(it), 20), args.queries))
+    print_row('suggest top 20', suggest)
+
+    pairs = iter([(rng.randint(1, args.users), rng.randint(1, args.users)) for _ in range(args.queries)])
+    mutual = summarize(time_calls(lambda: graph.mutual(*next(pairs)), args.queries))
+    print_row('mutual friends', mutual)
+
+    print(json.dumps({
+        'users': args.users,
+        'edges': args.edges,
+        'build_seconds': round(build_seconds, 2),
+        'index_bytes': graph.memory_bytes(),
+        'suggest': suggest,
+        'mutual': mutual,
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,9 @@
+-- Trigram indexes serve substring search on display name and email
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_users_display_name_trgm ON users USING gin (lower(display_name) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_users_email_trgm ON users USING gin (lower(email) gin_trgm_ops);
+
+-- Prefix indexes serve short queries and rank prefix matches
+CREATE INDEX IF NOT EXISTS idx_users_display_name_prefix ON users (lower(display_name) text_pattern_ops);
+CREATE INDEX IF NOT EXISTS idx_users_email_prefix ON users (lower(email) text_pattern_ops);
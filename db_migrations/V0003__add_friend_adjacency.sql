@@ -0,0 +1,35 @@
+-- Symmetric adjacency: one row per direction of every friendship,
+-- so "friends of X" is a single primary-key range scan
+CREATE TABLE IF NOT EXISTS friend_adjacency (
+    user_id INTEGER NOT NULL REFERENCES users(id),
+    friend_id INTEGER NOT NULL REFERENCES users(id),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (user_id, friend_id)
+);
+
+CREATE OR REPLACE FUNCTION sync_friend_adjacency() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO friend_adjacency (user_id, friend_id, created_at)
+        VALUES (NEW.user1_id, NEW.user2_id, NEW.created_at),
+               (NEW.user2_id, NEW.user1_id, NEW.created_at)
+        ON CONFLICT DO NOTHING;
+        RETURN NEW;
+    END IF;
+    DELETE FROM friend_adjacency
+    WHERE (user_id = OLD.user1_id AND friend_id = OLD.user2_id)
+       OR (user_id = OLD.user2_id AND friend_id = OLD.user1_id);
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_friendships_adjacency ON friendships;
+CREATE TRIGGER trg_friendships_adjacency
+    AFTER INSERT OR DELETE ON friendships
+    FOR EACH ROW EXECUTE FUNCTION sync_friend_adjacency();
+
+INSERT INTO friend_adjacency (user_id, friend_id, created_at)
+SELECT user1_id, user2_id, created_at FROM friendships
+UNION ALL
+SELECT user2_id, user1_id, created_at FROM friendships
+ON CONFLICT DO NOTHING;
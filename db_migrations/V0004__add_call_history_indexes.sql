@@ -0,0 +1,8 @@
+-- Per-side composite indexes return a user's calls already ordered by time,
+-- so history pages are two short index range scans merged together
+CREATE INDEX IF NOT EXISTS idx_calls_caller_started ON calls (caller_id, started_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_calls_receiver_started ON calls (receiver_id, started_at DESC, id DESC);
+
+-- Superseded by the composite indexes above
+DROP INDEX IF EXISTS idx_calls_caller;
+DROP INDEX IF EXISTS idx_calls_receiver;
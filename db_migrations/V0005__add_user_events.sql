@@ -0,0 +1,58 @@
+-- Per-user event log read by the events function; id doubles as the client cursor
+CREATE TABLE IF NOT EXISTS user_events (
+    id BIGSERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id),
+    kind VARCHAR(30) NOT NULL,
+    payload JSONB NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_user_events_user ON user_events (user_id, id);
+
+-- Wakes long-polling listeners; payload is "<user_id>:<event_id>"
+CREATE OR REPLACE FUNCTION notify_user_event() RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('user_events', NEW.user_id || ':' || NEW.id);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_user_events_notify ON user_events;
+CREATE TRIGGER trg_user_events_notify
+    AFTER INSERT ON user_events
+    FOR EACH ROW EXECUTE FUNCTION notify_user_event();
+
+CREATE OR REPLACE FUNCTION record_incoming_call() RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO user_events (user_id, kind, payload)
+    VALUES (NEW.receiver_id, 'incoming_call', jsonb_build_object(
+        'call_id', NEW.id,
+        'caller_id', NEW.caller_id,
+        'status', NEW.status,
+        'started_at', NEW.started_at
+    ));
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_calls_event ON calls;
+CREATE TRIGGER trg_calls_event
+    AFTER INSERT ON calls
+    FOR EACH ROW EXECUTE FUNCTION record_incoming_call();
+
+CREATE OR REPLACE FUNCTION record_friend_request() RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO user_events (user_id, kind, payload)
+    VALUES (NEW.receiver_id, 'friend_request', jsonb_build_object(
+        'request_id', NEW.id,
+        'sender_id', NEW.sender_id,
+        'created_at', NEW.created_at
+    ));
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_friend_requests_event ON friend_requests;
+CREATE TRIGGER trg_friend_requests_event
+    AFTER INSERT ON friend_requests
+    FOR EACH ROW EXECUTE FUNCTION record_friend_request();
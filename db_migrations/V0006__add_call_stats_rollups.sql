@@ -0,0 +1,23 @@
+-- Per-user call totals maintained by end_call and the backfill job
+CREATE TABLE IF NOT EXISTS user_call_stats (
+    user_id INTEGER PRIMARY KEY REFERENCES users(id),
+    calls_made INTEGER NOT NULL DEFAULT 0,
+    calls_received INTEGER NOT NULL DEFAULT 0,
+    answered INTEGER NOT NULL DEFAULT 0,
+    missed INTEGER NOT NULL DEFAULT 0,
+    seconds_total BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS user_call_stats_daily (
+    user_id INTEGER NOT NULL REFERENCES users(id),
+    day DATE NOT NULL,
+    calls INTEGER NOT NULL DEFAULT 0,
+    answered INTEGER NOT NULL DEFAULT 0,
+    missed INTEGER NOT NULL DEFAULT 0,
+    seconds_total BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, day)
+);
+
+-- Set in the same statement that adds a call to the rollups, so each call is counted once
+ALTER TABLE calls ADD COLUMN IF NOT EXISTS stats_recorded BOOLEAN NOT NULL DEFAULT FALSE;
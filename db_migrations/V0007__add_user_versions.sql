@@ -0,0 +1,117 @@
+-- Per-user version stamps behind the ETags on friends, requests and history.
+-- Values come from one sequence, so a stamp is never reused for different content
+CREATE SEQUENCE IF NOT EXISTS user_version_seq;
+
+CREATE TABLE IF NOT EXISTS user_versions (
+    user_id INTEGER PRIMARY KEY REFERENCES users(id),
+    friends BIGINT NOT NULL DEFAULT 0,
+    requests BIGINT NOT NULL DEFAULT 0,
+    calls BIGINT NOT NULL DEFAULT 0
+);
+
+-- Statement-level triggers bump each affected user once per statement,
+-- so a bulk accept of 1000 requests is one upsert, not 1000
+CREATE OR REPLACE FUNCTION bump_friends_version() RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO user_versions (user_id, friends)
+    SELECT user_id, nextval('user_version_seq')
+    FROM (SELECT DISTINCT user_id FROM changed_rows ORDER BY user_id) u
+    ON CONFLICT (user_id) DO UPDATE SET friends = EXCLUDED.friends;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_friend_adjacency_version_ins ON friend_adjacency;
+CREATE TRIGGER trg_friend_adjacency_version_ins
+    AFTER INSERT ON friend_adjacency
+    REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_friends_version();
+
+DROP TRIGGER IF EXISTS trg_friend_adjacency_version_del ON friend_adjacency;
+CREATE TRIGGER trg_friend_adjacency_version_del
+    AFTER DELETE ON friend_adjacency
+    REFERENCING OLD TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_friends_version();
+
+-- Only the receiver sees a request in action=requests
+CREATE OR REPLACE FUNCTION bump_requests_version() RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO user_versions (user_id, requests)
+    SELECT receiver_id, nextval('user_version_seq')
+    FROM (SELECT DISTINCT receiver_id FROM changed_rows ORDER BY receiver_id) r
+    ON CONFLICT (user_id) DO UPDATE SET requests = EXCLUDED.requests;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_friend_requests_version_ins ON friend_requests;
+CREATE TRIGGER trg_friend_requests_version_ins
+    AFTER INSERT ON friend_requests
+    REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_requests_version();
+
+DROP TRIGGER IF EXISTS trg_friend_requests_version_upd ON friend_requests;
+CREATE TRIGGER trg_friend_requests_version_upd
+    AFTER UPDATE ON friend_requests
+    REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_requests_version();
+
+DROP TRIGGER IF EXISTS trg_friend_requests_version_del ON friend_requests;
+CREATE TRIGGER trg_friend_requests_version_del
+    AFTER DELETE ON friend_requests
+    REFERENCING OLD TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_requests_version();
+
+CREATE OR REPLACE FUNCTION bump_calls_version() RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO user_versions (user_id, calls)
+    SELECT user_id, nextval('user_version_seq')
+    FROM (
+        SELECT caller_id AS user_id FROM changed_rows
+        UNION
+        SELECT receiver_id FROM changed_rows
+        ORDER BY user_id
+    ) u
+    ON CONFLICT (user_id) DO UPDATE SET calls = EXCLUDED.calls;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Updates only count when a column shown by history changes,
+-- so the stats_recorded backfill does not invalidate every client
+CREATE OR REPLACE FUNCTION bump_calls_version_on_update() RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO user_versions (user_id, calls)
+    SELECT user_id, nextval('user_version_seq')
+    FROM (
+        SELECT n.caller_id AS user_id
+        FROM new_rows n JOIN old_rows o ON o.id = n.id
+        WHERE (n.status, n.ended_at, n.duration_seconds) IS DISTINCT FROM (o.status, o.ended_at, o.duration_seconds)
+        UNION
+        SELECT n.receiver_id
+        FROM new_rows n JOIN old_rows o ON o.id = n.id
+        WHERE (n.status, n.ended_at, n.duration_seconds) IS DISTINCT FROM (o.status, o.ended_at, o.duration_seconds)
+        ORDER BY user_id
+    ) u
+    ON CONFLICT (user_id) DO UPDATE SET calls = EXCLUDED.calls;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_calls_version_ins ON calls;
+CREATE TRIGGER trg_calls_version_ins
+    AFTER INSERT ON calls
+    REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_calls_version();
+
+DROP TRIGGER IF EXISTS trg_calls_version_upd ON calls;
+CREATE TRIGGER trg_calls_version_upd
+    AFTER UPDATE ON calls
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_calls_version_on_update();
+
+DROP TRIGGER IF EXISTS trg_calls_version_del ON calls;
+CREATE TRIGGER trg_calls_version_del
+    AFTER DELETE ON calls
+    REFERENCING OLD TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_calls_version();
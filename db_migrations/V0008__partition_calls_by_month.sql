@@ -0,0 +1,81 @@
+-- calls becomes a monthly range-partitioned table on started_at. History, export
+-- and the maintenance job only touch the months they need, and old months are
+-- detached and archived whole instead of deleted row by row
+ALTER TABLE calls RENAME TO calls_legacy;
+ALTER TABLE calls_legacy RENAME CONSTRAINT calls_pkey TO calls_legacy_pkey;
+
+-- The partition key must be part of the primary key; ids still come from calls_id_seq
+CREATE TABLE calls (
+    id INTEGER NOT NULL DEFAULT nextval('calls_id_seq'),
+    caller_id INTEGER REFERENCES users(id),
+    receiver_id INTEGER REFERENCES users(id),
+    status VARCHAR(20) DEFAULT 'pending' CHECK (status IN ('pending', 'active', 'ended', 'missed')),
+    started_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    ended_at TIMESTAMP,
+    duration_seconds INTEGER DEFAULT 0,
+    stats_recorded BOOLEAN NOT NULL DEFAULT FALSE,
+    PRIMARY KEY (id, started_at)
+) PARTITION BY RANGE (started_at);
+
+-- Used here and by scripts/maintain_call_partitions.py; returns the partition name
+CREATE OR REPLACE FUNCTION create_calls_partition(month DATE) RETURNS TEXT AS $$
+DECLARE
+    lo DATE := date_trunc('month', month)::date;
+    part TEXT := 'calls_p' || to_char(lo, 'YYYY_MM');
+BEGIN
+    IF to_regclass(quote_ident(part)) IS NULL THEN
+        EXECUTE format('CREATE TABLE %I PARTITION OF calls FOR VALUES FROM (%L) TO (%L)',
+                       part, lo, (lo + interval '1 month')::date);
+    END IF;
+    RETURN part;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT create_calls_partition(m::date)
+FROM generate_series(
+    date_trunc('month', (SELECT COALESCE(MIN(started_at), CURRENT_TIMESTAMP) FROM calls_legacy)),
+    date_trunc('month', CURRENT_TIMESTAMP) + interval '3 months',
+    interval '1 month'
+) m;
+
+-- Catches rows outside every monthly range (e.g. if maintenance stops running);
+-- the maintenance job reports when it is not empty
+CREATE TABLE IF NOT EXISTS calls_default PARTITION OF calls DEFAULT;
+
+-- Copy before creating the secondary indexes and triggers, so the load neither
+-- maintains them row by row nor replays events and version bumps for old calls
+INSERT INTO calls (id, caller_id, receiver_id, status, started_at, ended_at, duration_seconds, stats_recorded)
+SELECT id, caller_id, receiver_id, status, COALESCE(started_at, 'epoch'::timestamp),
+       ended_at, duration_seconds, stats_recorded
+FROM calls_legacy;
+
+ALTER SEQUENCE calls_id_seq OWNED BY calls.id;
+DROP TABLE calls_legacy;
+
+CREATE INDEX IF NOT EXISTS idx_calls_caller_started ON calls (caller_id, started_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_calls_receiver_started ON calls (receiver_id, started_at DESC, id DESC);
+
+DROP TRIGGER IF EXISTS trg_calls_event ON calls;
+CREATE TRIGGER trg_calls_event
+    AFTER INSERT ON calls
+    FOR EACH ROW EXECUTE FUNCTION record_incoming_call();
+
+DROP TRIGGER IF EXISTS trg_calls_version_ins ON calls;
+CREATE TRIGGER trg_calls_version_ins
+    AFTER INSERT ON calls
+    REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_calls_version();
+
+DROP TRIGGER IF EXISTS trg_calls_version_upd ON calls;
+CREATE TRIGGER trg_calls_version_upd
+    AFTER UPDATE ON calls
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_calls_version_on_update();
+
+DROP TRIGGER IF EXISTS trg_calls_version_del ON calls;
+CREATE TRIGGER trg_calls_version_del
+    AFTER DELETE ON calls
+    REFERENCING OLD TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_calls_version();
+
+ANALYZE calls;
@@ -0,0 +1,11 @@
+-- Calls still ringing or in progress are a tiny slice of the table. Partial
+-- indexes over just those rows make "is this user in a call?" one short probe
+-- per side and let the reaper find stale calls without touching history.
+-- On the partitioned calls table each partition gets its own small index,
+-- and finished months keep theirs empty
+CREATE INDEX IF NOT EXISTS idx_calls_active_caller ON calls (caller_id, started_at DESC)
+    WHERE status IN ('pending', 'active');
+CREATE INDEX IF NOT EXISTS idx_calls_active_receiver ON calls (receiver_id, started_at DESC)
+    WHERE status IN ('pending', 'active');
+CREATE INDEX IF NOT EXISTS idx_calls_active_started ON calls (started_at)
+    WHERE status IN ('pending', 'active');
@@ -0,0 +1,3 @@
+-- Supports scripts/prune_user_events.py: oldest events are found and deleted in
+-- created_at order without scanning the whole event log
+CREATE INDEX IF NOT EXISTS idx_user_events_created ON user_events (created_at);
@@ -0,0 +1,58 @@
+'''
+Business: One-off backfill of call statistics rollups from existing calls
+Args: DATABASE_URL; --chunk ids per transaction, --pause seconds between chunks
+Returns: prints progress; safe to re-run and to run while end_call is live
+'''
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'backend'))
+
+from shared.db import connection
+from shared.call_stats import with_rollup
+
+CHUNK_SQL = """
+    WITH picked AS (
+        UPDATE calls
+        SET stats_recorded = TRUE
+        WHERE id >= %(lo)s AND id < %(hi)s
+          AND NOT stats_recorded
+          AND status IN ('ended', 'missed')
+        RETURNING caller_id, receiver_id, status, started_at, duration_seconds
+    ), """ + with_rollup('picked') + """
+    SELECT COUNT(*) AS calls FROM picked
+"""
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--chunk', type=int, default=10000)
+    parser.add_argument('--pause', type=float, default=0.0)
+    args = parser.parse_args()
+
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT COALESCE(MIN(id), 0) AS lo, COALESCE(MAX(id), 0) AS hi FROM calls")
+        bounds = cur.fetchone()
+        conn.rollback()
+
+        total = 0
+        lo = bounds['lo']
+        while lo <= bounds['hi']:
+            hi = lo + args.chunk
+            cur.execute(CHUNK_SQL, {'lo': lo, 'hi': hi})
+            total += cur.fetchone()['calls']
+            conn.commit()
+            print(f'ids {lo}..{hi - 1}: {total} calls rolled up', flush=True)
+            lo = hi
+            if args.pause:
+                time.sleep(args.pause)
+        cur.close()
+    print(f'done, {total} calls added to rollups')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+'''
+Business: Monthly partition upkeep for calls: create future months, archive and drop expired ones
+Args: DATABASE_URL; --ahead months to pre-create, --retain months to keep attached,
+      --archive-dir for the gzipped CSV files, --keep-detached, --dry-run
+Returns: prints each action; safe to re-run and meant to run daily from cron
+'''
+
+import argparse
+import gzip
+import os
+import re
+import sys
+import time
+from datetime import date
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'backend'))
+
+from shared.db import connection
+
+PARTITION_NAME = re.compile(r'^calls_p(\d{4})_(\d{2})$')
+
+ENSURE_SQL = """
+    SELECT create_calls_partition((date_trunc('month', LOCALTIMESTAMP) + make_interval(months => g))::date) AS name
+    FROM generate_series(0, %(ahead)s) g
+"""
+
+# Attached monthly partitions, plus ones a previous run detached but did not finish archiving
+PARTITIONS_SQL = """
+    SELECT c.relname AS name, c.relispartition AS attached
+    FROM pg_class c
+    WHERE c.relkind = 'r' AND c.relname ~ '^calls_p[0-9]{4}_[0-9]{2}$'
+      AND c.relnamespace = (SELECT relnamespace FROM pg_class WHERE oid = 'calls'::regclass)
+    ORDER BY c.relname
+"""
+
+
+class CountingWriter:
+    '''Passes bytes through to the archive file and counts lines for the row check.'''
+
+    def __init__(self, target):
+        self.target = target
+        self.lines = 0
+
+    def write(self, data) -> int:
+        if isinstance(data, str):
+            data = data.encode()
+        self.lines += data.count(b'\n')
+        return self.target.write(data)
+
+
+def month_of(name: str) -> date:
+    match = PARTITION_NAME.match(name)
+    return date(int(match.group(1)), int(match.group(2)), 1)
+
+
+def months_before(day: date, months: int) -> date:
+    index = day.year * 12 + day.month - 1 - months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def archive(cur, name: str, directory: Path) -> int:
+    directory.mkdir(parents=True, exist_ok=True)
+    final = directory / f'{name}.csv.gz'
+    partial = directory / f'{name}.csv.gz.partial'
+    cur.execute(f'SELECT COUNT(*) AS n FROM {name}')
+    expected = cur.fetchone()['n']
+    with open(partial, 'wb') as raw:
+        with gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=6) as gz:
+            writer = CountingWriter(gz)
+            cur.copy_expert(f'COPY {name} TO STDOUT WITH (FORMAT csv, HEADER)', writer)
+        raw.flush()
+        os.fsync(raw.fileno())
+    if writer.lines - 1 != expected:
+        raise RuntimeError(f'{name}: archived {writer.lines - 1} rows, expected {expected}')
+    os.replace(partial, final)
+    return expected
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--ahead', type=int, default=3, help='future months to keep created')
+    parser.add_argument('--retain', type=int, default=24, help='months of calls to keep attached')
+    parser.add_argument('--archive-dir', default=os.environ.get('CALLS_ARCHIVE_DIR', 'archive/calls'))
+    parser.add_argument('--keep-detached', action='store_true', help='archive but do not drop expired partitions')
+    parser.add_argument('--lock-timeout', default='5s')
+    parser.add_argument('--dry-run', action='store_true')
+    args = parser.parse_args()
+
+    cutoff = months_before(date.today().replace(day=1), args.retain)
+    directory = Path(args.archive_dir)
+
+    with connection() as conn:
+        conn.autocommit = True
+        cur = conn.cursor()
+        try:
+            cur.execute(f"SET lock_timeout = '{args.lock_timeout}'")
+            if not args.dry_run:
+                cur.execute(ENSURE_SQL, {'ahead': args.ahead})
+                print(f"partitions present through {cur.fetchall()[-1]['name']}", flush=True)
+
+            cur.execute("SELECT COUNT(*) AS n, MIN(started_at) AS lo, MAX(started_at) AS hi FROM calls_default")
+            stray = cur.fetchone()
+            if stray['n']:
+                print(f"warning: calls_default holds {stray['n']} calls from {stray['lo']} to {stray['hi']}",
+                      file=sys.stderr)
+
+            cur.execute(PARTITIONS_SQL)
+            expired = [row for row in cur.fetchall() if months_before(month_of(row['name']), -1) <= cutoff]
+            for row in expired:
+                name = row['name']
+                if args.dry_run:
+                    print(f'would archive {name} to {directory / (name + ".csv.gz")}')
+                    continue
+                started = time.perf_counter()
+                if row['attached']:
+                    cur.execute(f'ALTER TABLE calls DETACH PARTITION {name}')
+                rows = archive(cur, name, directory)
+                if not args.keep_detached:
+                    cur.execute(f'DROP TABLE {name}')
+                print(f'{name}: {rows} calls archived in {time.perf_counter() - started:.1f}s'
+                      f'{"" if args.keep_detached else ", partition dropped"}', flush=True)
+        finally:
+            cur.close()
+            conn.autocommit = False
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+'''
+Business: Delete delivered long-poll events older than the retention period, in bounded chunks
+Args: DATABASE_URL; --retain-hours (USER_EVENTS_RETAIN_HOURS), --chunk rows per transaction,
+      --pause seconds between chunks, --every seconds to keep running instead of exiting once drained
+Returns: prints progress; safe to re-run and to run next to live long polls
+'''
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'backend'))
+
+from shared.db import connection
+
+# Walks idx_user_events_created (V0010) from the oldest row; SKIP LOCKED lets copies share the backlog
+PRUNE_SQL = """
+    WITH expired AS (
+        SELECT id
+        FROM user_events
+        WHERE created_at < LOCALTIMESTAMP - %(retain)s * interval '1 hour'
+        ORDER BY created_at
+        LIMIT %(chunk)s
+        FOR UPDATE SKIP LOCKED
+    ), deleted AS (
+        DELETE FROM user_events e
+        USING expired x
+        WHERE e.id = x.id
+        RETURNING 1
+    )
+    SELECT COUNT(*) AS events FROM deleted
+"""
+
+
+def drain(conn, args) -> int:
+    cur = conn.cursor()
+    total = 0
+    try:
+        while True:
+            cur.execute(PRUNE_SQL, {'retain': args.retain_hours, 'chunk': args.chunk})
+            deleted = cur.fetchone()['events']
+            conn.commit()
+            total += deleted
+            if deleted:
+                print(f'{total} expired events deleted', flush=True)
+            if deleted < args.chunk:
+                return total
+            if args.pause:
+                time.sleep(args.pause)
+    finally:
+        cur.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--retain-hours', type=int, default=int(os.environ.get('USER_EVENTS_RETAIN_HOURS', '168')))
+    parser.add_argument('--chunk', type=int, default=5000)
+    parser.add_argument('--pause', type=float, default=0.0)
+    parser.add_argument('--every', type=float, default=0.0, help='repeat every N seconds; 0 runs once')
+    args = parser.parse_args()
+
+    while True:
+        with connection() as conn:
+            total = drain(conn, args)
+        print(f'done, {total} events deleted', flush=True)
+        if not args.every:
+            break
+        time.sleep(args.every)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+'''
+Business: Mark calls abandoned by crashed clients as missed, in bounded chunks
+Args: DATABASE_URL; --chunk calls per transaction, --stale-minutes, --pause seconds between chunks,
+      --every seconds to keep running instead of exiting once drained
+Returns: prints progress; any number of copies can run at the same time
+'''
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'backend'))
+
+from shared.db import connection
+from shared.call_reaper import STALE_MINUTES, reap_chunk
+
+
+def drain(conn, args) -> int:
+    total = 0
+    while True:
+        reaped = reap_chunk(conn, args.chunk, args.stale_minutes)
+        total += reaped
+        if reaped:
+            print(f'{total} stale calls marked missed', flush=True)
+        # A short chunk means the backlog is empty or held by other reapers
+        if reaped < args.chunk:
+            return total
+        if args.pause:
+            time.sleep(args.pause)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--chunk', type=int, default=1000)
+    parser.add_argument('--stale-minutes', type=int, default=STALE_MINUTES)
+    parser.add_argument('--pause', type=float, default=0.0)
+    parser.add_argument('--every', type=float, default=0.0, help='repeat every N seconds; 0 runs once')
+    args = parser.parse_args()
+
+    while True:
+        with connection() as conn:
+            total = drain(conn, args)
+        print(f'done, {total} calls reaped', flush=True)
+        if not args.every:
+            break
+        time.sleep(args.every)
+
+
+if __name__ == '__main__':
+    main()
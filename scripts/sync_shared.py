@@ -0,0 +1,58 @@
+'''
+Business: Copy backend/shared into every function directory so each deploys with its own copy
+Args: --check to only compare and exit 1 when a copy differs from backend/shared
+Returns: prints the copies it rewrote or found out of date
+'''
+
+import argparse
+import filecmp
+import shutil
+import sys
+from pathlib import Path
+from typing import List
+
+BACKEND = Path(__file__).resolve().parent.parent / 'backend'
+SOURCE = BACKEND / 'shared'
+IGNORE = shutil.ignore_patterns('__pycache__', '*.pyc')
+
+
+def functions() -> List[Path]:
+    '''Every directory with an index.py is a deployed function.'''
+    return sorted(path.parent for path in BACKEND.glob('*/index.py'))
+
+
+def files(root: Path) -> List[Path]:
+    return sorted(path.relative_to(root) for path in root.rglob('*')
+                  if path.is_file() and '__pycache__' not in path.parts)
+
+
+def differs(source: Path, copy: Path) -> bool:
+    if copy.is_symlink() or not copy.is_dir():
+        return True
+    names = files(source)
+    return names != files(copy) or any(not filecmp.cmp(source / name, copy / name, shallow=False)
+                                       for name in names)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--check', action='store_true', help='report stale copies instead of rewriting them')
+    args = parser.parse_args()
+
+    stale = [function / 'shared' for function in functions() if differs(SOURCE, function / 'shared')]
+    for copy in stale:
+        if args.check:
+            print(f'{copy.relative_to(BACKEND.parent)} differs from backend/shared', flush=True)
+            continue
+        if copy.is_symlink() or copy.is_file():
+            copy.unlink()
+        elif copy.exists():
+            shutil.rmtree(copy)
+        shutil.copytree(SOURCE, copy, ignore=IGNORE)
+        print(f'{copy.relative_to(BACKEND.parent)} updated', flush=True)
+    if args.check and stale:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -25,6 +25,7 @@ export default function CallScreen({ contact, userId, onEndCall }: CallScreenPro
   const [isVideoOn, setIsVideoOn] = useState(true);
   const [callStatus, setCallStatus] = useState<'calling' | 'connected'>('calling');
   const [callId, setCallId] = useState<number | null>(null);
+  const [callStartedAt, setCallStartedAt] = useState<string | null>(null);
 
   useEffect(() => {
     startCall();
@@ -47,6 +48,7 @@ export default function CallScreen({ contact, userId, onEndCall }: CallScreenPro
       const data = await response.json();
       if (response.ok && data.call) {
         setCallId(data.call.id);
+        setCallStartedAt(data.call.started_at);
         setTimeout(() => {
           setCallStatus('connected');
         }, 2000);
@@ -139,7 +141,8 @@ export default function CallScreen({ contact, userId, onEndCall }: CallScreenPro
                   },
                   body: JSON.stringify({
                     action: 'end_call',
-                    call_id: callId
+                    call_id: callId,
+                    started_at: callStartedAt
                   })
                 });
               } catch (error) {
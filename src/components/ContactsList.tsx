@@ -31,11 +31,22 @@ export default function ContactsList({ userId, onCallStart }: ContactsListProps)
 
   const loadContacts = async () => {
     try {
-      const response = await fetch(`${CONTACTS_URL}?action=friends`, {
-        headers: { 'X-User-Id': userId }
-      });
-      const data = await response.json();
-      setContacts(data.friends || []);
+      // The list is paginated: follow next_cursor until every friend is loaded
+      let loaded: Contact[] = [];
+      let cursor: string | null = null;
+      do {
+        const params = new URLSearchParams({ action: 'friends', limit: '500' });
+        if (cursor) params.set('cursor', cursor);
+        const response = await fetch(`${CONTACTS_URL}?${params}`, {
+          headers: { 'X-User-Id': userId }
+        });
+        const data = await response.json();
+        if (!response.ok) break;
+        loaded = [...loaded, ...(data.friends || [])];
+        setContacts(loaded);
+        setIsLoading(false);
+        cursor = data.next_cursor || null;
+      } while (cursor);
     } catch (error) {
       console.error('Failed to load contacts:', error);
     } finally {